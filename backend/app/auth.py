@@ -4,7 +4,6 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-import hashlib # Use simple hashing
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
@@ -17,12 +16,14 @@ from jose import jwt, JWTError
 
 # Importing schemas for token data
 from schemas import CustomerRead, RetailerRead, WholesalerRead
-from database import get_customer_by_email, get_retailer_by_email, get_wholesaler_by_email
+from database import get_customer_by_email, get_retailer_by_email, get_wholesaler_by_email, get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from fastapi import Depends, HTTPException, status , BackgroundTasks
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.concurrency import run_in_threadpool
 from db_models import Customer, Retailer, Wholesaler
 from config import SECRET_KEY, ALGORITHM
+from principal_cache import principal_cache
+from identities import ROLE_MODELS
 #--------------------------------------------------------------------------------------------------------------------------------------------
 
 # SMTP
@@ -84,16 +85,9 @@ async def send_verification_email(email: str, otp: str, background_tasks: Backgr
 
 #--------------------------------------------------------------------------------------------------------------------------------------------
 
-# 1. Managing Passwords (Simple hashlib.sha256)
+# 1. Managing Passwords (scrypt in a process pool, see passwords.py)
 
-# Returns the hashed password
-def hash_password(password: str):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-
-# Verifies the password
-def verify_password(input_password: str , hashed_password: str):
-    return hash_password(input_password) == hashed_password
+from passwords import hash_password, verify_password, hash_password_async, check_password_async
 
 #--------------------------------------------------------------------------------------------------------------------------------------------
 
@@ -119,8 +113,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# Dependency to get the current logged-in customer
-async def get_current_customer(creds: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> Customer:
+PRINCIPAL_LOOKUPS = {
+    "customer": get_customer_by_email,
+    "retailer": get_retailer_by_email,
+    "wholesaler": get_wholesaler_by_email,
+}
+
+# Resolves the bearer token to its account. Accounts are served from principal_cache when possible;
+# otherwise tokens issued at login carry the account id ("uid") for a primary-key lookup, and older
+# tokens are looked up by email. A cached account can be up to PRINCIPAL_CACHE_TTL old: endpoints
+# read it as is, but session.refresh() it before changing it.
+async def get_current_principal(creds: HTTPAuthorizationCredentials, session: AsyncSession, role: str):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -131,59 +134,48 @@ async def get_current_customer(creds: HTTPAuthorizationCredentials = Depends(bea
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_mail: str = payload.get("sub")
         user_role: str = payload.get("role")
-        if user_mail is None or user_role != "customer":
+        if user_mail is None or user_role != role:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = await run_in_threadpool(get_customer_by_email, mail=user_mail) 
+
+    cached = principal_cache.get(role, user_mail)
+    if cached is not None:
+        return await session.merge(cached, load=False)
+
+    generation = principal_cache.generation
+    user_id = payload.get("uid")
+    if user_id is not None:
+        user = await session.get(ROLE_MODELS[role], user_id)
+        if user is not None and user.mail != user_mail:
+            user = None
+    else:
+        user = await PRINCIPAL_LOOKUPS[role](session, user_mail)
     if user is None:
         raise credentials_exception
+    principal_cache.put(role, user, generation)
     return user
 
+# Dependency to get the current logged-in customer
+async def get_current_customer(
+    creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    session: AsyncSession = Depends(get_session)
+) -> Customer:
+    return await get_current_principal(creds, session, "customer")
+
 # Dependency to get the current logged-in retailer
-async def get_current_retailer(creds: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> Retailer:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    token = creds.credentials
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_mail: str = payload.get("sub")
-        user_role: str = payload.get("role")
-        if user_mail is None or user_role != "retailer":
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = await run_in_threadpool(get_retailer_by_email, mail=user_mail)
-    if user is None:
-        raise credentials_exception
-    return user
+async def get_current_retailer(
+    creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    session: AsyncSession = Depends(get_session)
+) -> Retailer:
+    return await get_current_principal(creds, session, "retailer")
 
 # Dependency to get the current logged-in wholesaler
-async def get_current_wholesaler(creds: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> Wholesaler:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    token = creds.credentials
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_mail: str = payload.get("sub")
-        user_role: str = payload.get("role")
-        if user_mail is None or user_role != "wholesaler":
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = await run_in_threadpool(get_wholesaler_by_email, mail=user_mail)
-    if user is None:
-        raise credentials_exception
-    return user
+async def get_current_wholesaler(
+    creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    session: AsyncSession = Depends(get_session)
+) -> Wholesaler:
+    return await get_current_principal(creds, session, "wholesaler")
 
 #--------------------------------------------------------------------------------------------------------------------------------------------
 
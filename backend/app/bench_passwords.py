@@ -0,0 +1,93 @@
+# Password hashing benchmark: logins per second per core, and what hashing does to the event loop
+# Run from backend/app (no database needed):
+#     python bench_passwords.py [--logins 200] [--workers N]
+#
+# Measures, on one core, how many logins per second each stored format allows: the legacy
+# sha256 digest, its one-time upgrade to scrypt, and scrypt at the configured cost. Then runs a burst
+# of concurrent logins through the process pool (check_password_async) next to a 10 ms ticker and
+# reports the throughput and the ticker's worst delay, against the same burst hashed on the event loop.
+
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+
+from config import PASSWORD_HASH_WORKERS, PASSWORD_SCRYPT_LOG_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P
+import passwords
+from passwords import hash_password, verify_password, check_password, check_password_async, shutdown_password_pool
+
+PASSWORD = "correct horse battery staple"
+TICK = 0.01
+
+
+def bench_single_core(logins):
+    legacy = hashlib.sha256(PASSWORD.encode()).hexdigest()
+    current = hash_password(PASSWORD)
+    print(f"One core, scrypt n=2^{PASSWORD_SCRYPT_LOG_N} r={PASSWORD_SCRYPT_R} p={PASSWORD_SCRYPT_P}:")
+    for label, login, stored, rounds in (
+        ("legacy sha256 (before)", verify_password, legacy, logins * 100),
+        ("legacy sha256 + rehash", check_password, legacy, logins),
+        ("scrypt", check_password, current, logins),
+    ):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            login(PASSWORD, stored)
+        elapsed = time.perf_counter() - started
+        print(f"  {label:<26}{rounds / elapsed:10,.0f} logins/s   {elapsed / rounds * 1000:8.3f} ms each", flush=True)
+
+
+# Runs 'logins' concurrent logins with a ticker that should wake every TICK seconds; returns
+# (logins per second, worst ticker delay in ms)
+async def burst(logins, login):
+    stored = hash_password(PASSWORD)
+    worst = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal worst
+        while not done.is_set():
+            expected = time.perf_counter() + TICK
+            await asyncio.sleep(TICK)
+            worst = max(worst, time.perf_counter() - expected)
+
+    ticking = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(login(stored) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticking
+    return logins / elapsed, worst * 1000
+
+
+async def on_event_loop(stored):
+    await asyncio.sleep(0)
+    check_password(PASSWORD, stored)
+
+
+async def in_pool(stored):
+    await check_password_async(PASSWORD, stored)
+
+
+async def bench_burst(logins, workers):
+    await check_password_async(PASSWORD, hash_password(PASSWORD))     # start the pool outside the timing
+    print(f"\nBurst of {logins} concurrent logins ({os.cpu_count()} cores, {workers} pool workers):")
+    pool_cores = min(workers, os.cpu_count() or 1)
+    for label, login, cores in (("on the event loop", on_event_loop, 1), ("process pool", in_pool, pool_cores)):
+        rate, worst = await burst(logins, login)
+        print(f"  {label:<26}{rate:10,.0f} logins/s   {rate / cores:8,.0f} per core"
+              f"   event loop stalled up to {worst:8.1f} ms", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark password hashing throughput and event loop impact")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=PASSWORD_HASH_WORKERS, help="pool size (default PASSWORD_HASH_WORKERS)")
+    args = parser.parse_args()
+
+    bench_single_core(args.logins)
+    passwords.PASSWORD_HASH_WORKERS = args.workers
+    try:
+        asyncio.run(bench_burst(args.logins, args.workers))
+    finally:
+        shutdown_password_pool()
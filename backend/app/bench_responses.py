@@ -0,0 +1,129 @@
+# Serialization and compression benchmark for the /products and /customer/orders payloads
+# Run from backend/app against a populated database (populate_db.py or generate_data.py):
+#     python bench_responses.py [--rounds 200]
+#
+# Compares the response paths an endpoint can take:
+#   response_model + json    FastAPI validates the returned value against response_model, converts it to
+#                            plain Python, then json.dumps it (the default before orjson)
+#   response_model + orjson  Same validation, encoded by ORJSONResponse (the app's default response class)
+#   schema_response          The endpoint's own TypeAdapter writes JSON in one step, no second validation
+# and how long gzip takes at each level, and what it saves.
+
+import argparse
+import asyncio
+import gzip
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic import TypeAdapter
+from sqlmodel import Session, select, func
+
+from database import engine
+from db_models import Product, OrderRecords, OrderItem
+from schemas import ProductRead, OrderRecordsRead, OrderItemRead
+
+PRODUCTS_PAGE = 200     # Largest /products page (MAX_PRODUCT_PAGE_SIZE)
+
+
+def load_products(session):
+    return session.exec(select(Product).order_by(Product.id.desc()).limit(PRODUCTS_PAGE)).all()
+
+
+# The order history of the customer with the most orders, built the way /customer/orders builds it
+def load_orders(session):
+    customer_id = session.exec(
+        select(OrderRecords.customer_id).group_by(OrderRecords.customer_id).order_by(func.count().desc()).limit(1)
+    ).first()
+    orders = session.exec(
+        select(OrderRecords).where(OrderRecords.customer_id == customer_id).order_by(OrderRecords.order_date.desc())
+    ).all()
+    results = []
+    for order in orders:
+        order_schema = OrderRecordsRead.model_validate(order)
+        items = session.exec(
+            select(OrderItem, Product.name)
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.orderrecords_id == order.id)
+        ).all()
+        order_items = []
+        for item, product_name in items:
+            item_schema = OrderItemRead.model_validate(item)
+            item_schema.product_name = product_name
+            order_items.append(item_schema)
+        order_schema.items = order_items
+        results.append(order_schema)
+    return results
+
+
+def best_of(run, rounds, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run(rounds)
+        best = min(best, (time.perf_counter() - started) / rounds)
+    return best * 1000
+
+
+def bench_encoding(label, response_type, content, adapter, to_json, rounds):
+    field = create_model_field(name="Response", type_=response_type, mode="serialization")
+
+    def through_response_model(response_class):
+        async def run(rounds):
+            for _ in range(rounds):
+                response_class(await serialize_response(field=field, response_content=content)).body
+        return lambda rounds: asyncio.run(run(rounds))
+
+    def direct(rounds):
+        for _ in range(rounds):
+            to_json(adapter, content)
+
+    results = [
+        ("response_model + json", best_of(through_response_model(JSONResponse), rounds)),
+        ("response_model + orjson", best_of(through_response_model(ORJSONResponse), rounds)),
+        ("schema_response", best_of(direct, rounds)),
+    ]
+    body = to_json(adapter, content)
+    baseline = results[0][1]
+    print(f"\n{label}: {len(body):,} bytes")
+    for name, ms in results:
+        print(f"  {name:<26}{ms:8.3f} ms   {baseline / ms:5.1f}x")
+    return body
+
+
+def bench_gzip(body, rounds):
+    print(f"  {'gzip level':<26}{'time':>8}      {'size':>10}")
+    for level in (1, 5, 9):
+        ms = best_of(lambda rounds: [gzip.compress(body, compresslevel=level) for _ in range(rounds)], rounds)
+        size = len(gzip.compress(body, compresslevel=level))
+        print(f"  {level:<26}{ms:8.3f} ms   {size:>10,} bytes ({size / len(body):.0%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JSON encoding and gzip for /products and /customer/orders")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        products = load_products(session)
+        orders = load_orders(session)
+    if not products or not orders:
+        raise SystemExit("Needs products and orders, run populate_db.py or generate_data.py first")
+
+    # /products validates the ORM rows once (from_attributes) and dumps them; /customer/orders already holds schemas
+    product_list = TypeAdapter(List[ProductRead])
+    order_list = TypeAdapter(List[OrderRecordsRead])
+    body = bench_encoding(
+        f"/products ({len(products)} products)", List[ProductRead], products, product_list,
+        lambda adapter, content: adapter.dump_json(adapter.validate_python(content, from_attributes=True)),
+        args.rounds
+    )
+    bench_gzip(body, args.rounds)
+    body = bench_encoding(
+        f"/customer/orders ({len(orders)} orders)", List[OrderRecordsRead], orders, order_list,
+        lambda adapter, content: adapter.dump_json(content),
+        args.rounds
+    )
+    bench_gzip(body, args.rounds)
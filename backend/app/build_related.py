@@ -0,0 +1,28 @@
+# Rebuilds the "frequently bought together" table (ProductRelation) from the order history
+# Run from backend/app after orders come in, e.g. nightly from cron:
+#     python build_related.py [--top-k 10] [--batch-size 20000] [--max-basket 50]
+# Safe to run while the server is up: each batch of products is replaced in its own transaction.
+
+import argparse
+import time
+
+from config import RELATED_PRODUCTS_TOP_K
+from database import rebuild_product_relations
+from migrate import migrate_db
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild frequently-bought-together products from OrderItem")
+    parser.add_argument("--top-k", type=int, default=RELATED_PRODUCTS_TOP_K, help="partners kept per product")
+    parser.add_argument("--batch-size", type=int, default=20000, help="product ids per batch (bounds memory per statement)")
+    parser.add_argument("--max-basket", type=int, default=50, help="orders with more distinct products are skipped")
+    args = parser.parse_args()
+
+    migrate_db()
+    started = time.perf_counter()
+
+    def report(start, end, rows):
+        print(f"products {start}-{end - 1}: {rows} relations ({time.perf_counter() - started:.1f}s)")
+
+    total = rebuild_product_relations(args.top_k, args.batch_size, args.max_basket, on_batch=report)
+    print(f"{total} relations in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,181 @@
+# In-memory registry of the Category table, with per-category product / in-stock counts
+#
+# Loaded once at startup (main.py lifespan) so category lookups in request handlers are dict lookups
+# instead of queries: name -> id for ?category=electronics, id -> metadata for /categories.
+# Counts are kept current by the session events below, which apply the product / category changes of
+# each committed transaction. Writes made outside this worker (other uvicorn workers, populate_db.py,
+# generate_data.py) are picked up by a full reload every CATEGORY_REFRESH_SECONDS.
+
+import threading
+import time
+
+from sqlalchemy import event, inspect, func, case
+from sqlmodel import Session, select
+
+from config import CATEGORY_REFRESH_SECONDS
+from db_models import Category, Product
+
+
+class CategoryRegistry:
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._by_id = {}        # category id -> {"id", "name", "description", "image_url"}
+        self._by_name = {}      # lower-cased name -> category id
+        self._counts = {}       # category id -> [products, products in stock]
+        self._lock = threading.Lock()
+        self._refresh_at = 0.0
+
+    # -------------------------------------------------------------
+    # Loading
+    # -------------------------------------------------------------
+
+    # 'session' is a sync Session: Session(engine) at startup, or AsyncSession.run_sync(registry.load)
+    def load(self, session):
+        categories = session.exec(select(Category)).all()
+        rows = session.exec(
+            select(Product.category_id, func.count(), func.sum(case((Product.stock > 0, 1), else_=0)))
+            .group_by(Product.category_id)
+        ).all()
+
+        by_id = {category.id: _metadata(category) for category in categories}
+        counts = {category_id: [products, in_stock or 0] for category_id, products, in_stock in rows}
+        with self._lock:
+            self._by_id = by_id
+            self._by_name = {meta["name"].lower(): category_id for category_id, meta in by_id.items()}
+            self._counts = counts
+            self._refresh_at = time.monotonic() + self.refresh_seconds
+
+    # True for one caller once the registry is older than refresh_seconds; that caller reloads it
+    def claim_refresh(self):
+        with self._lock:
+            if time.monotonic() < self._refresh_at:
+                return False
+            self._refresh_at = time.monotonic() + self.refresh_seconds
+            return True
+
+    # -------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------
+
+    def id_for(self, name: str):
+        return self._by_name.get(name.lower())
+
+    def get(self, category_id: int):
+        return self._by_id.get(category_id)
+
+    # ?category= accepts an id or a name (any case). Unknown names give None.
+    def resolve(self, value: str):
+        if value.isdigit():
+            return int(value)
+        return self.id_for(value)
+
+    # Categories with a word starting with 'prefix' (lower-case), the ones with most products first
+    def suggest(self, prefix: str, limit: int):
+        with self._lock:
+            matches = [
+                meta for meta in self._by_id.values()
+                if any(word.startswith(prefix) for word in meta["name"].lower().split())
+            ]
+            matches.sort(key=lambda meta: -self._counts.get(meta["id"], [0, 0])[0])
+            return matches[:limit]
+
+    def all(self):
+        with self._lock:
+            return [
+                {**meta, "product_count": self._counts.get(category_id, [0, 0])[0],
+                 "in_stock_count": self._counts.get(category_id, [0, 0])[1]}
+                for category_id, meta in sorted(self._by_id.items())
+            ]
+
+    # -------------------------------------------------------------
+    # Incremental updates (called after a commit)
+    # -------------------------------------------------------------
+
+    def apply(self, count_deltas, category_changes):
+        with self._lock:
+            for category_id, (products, in_stock) in count_deltas.items():
+                counts = self._counts.setdefault(category_id, [0, 0])
+                counts[0] += products
+                counts[1] += in_stock
+
+            for category_id, meta in category_changes.items():
+                old = self._by_id.pop(category_id, None)
+                if old is not None:
+                    self._by_name.pop(old["name"].lower(), None)
+                if meta is not None:
+                    self._by_id[category_id] = meta
+                    self._by_name[meta["name"].lower()] = category_id
+
+
+def _metadata(category):
+    return {
+        "id": category.id,
+        "name": category.name,
+        "description": category.description,
+        "image_url": category.image_url,
+    }
+
+
+category_registry = CategoryRegistry(CATEGORY_REFRESH_SECONDS)
+
+
+# -----------------------------------------------------------------
+# Write-Driven Updates
+# -----------------------------------------------------------------
+# after_flush still sees the pre-flush new / dirty / deleted sets and attribute history, and new rows
+# already have their ids. Changes are collected per transaction and applied once it commits.
+
+def _before(obj, key):
+    history = inspect(obj).attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(obj, key)
+
+
+def _count(deltas, category_id, stock, sign):
+    delta = deltas.setdefault(category_id, [0, 0])
+    delta[0] += sign
+    delta[1] += sign if stock > 0 else 0
+
+
+@event.listens_for(Session, "after_flush")
+def collect_category_changes(session, flush_context):
+    deltas = {}
+    changes = {}
+    for obj in session.new:
+        if isinstance(obj, Product):
+            _count(deltas, obj.category_id, obj.stock, 1)
+        elif isinstance(obj, Category):
+            changes[obj.id] = _metadata(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Product) and session.is_modified(obj):
+            _count(deltas, _before(obj, "category_id"), _before(obj, "stock"), -1)
+            _count(deltas, obj.category_id, obj.stock, 1)
+        elif isinstance(obj, Category) and session.is_modified(obj):
+            changes[obj.id] = _metadata(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            _count(deltas, _before(obj, "category_id"), _before(obj, "stock"), -1)
+        elif isinstance(obj, Category):
+            changes[obj.id] = None
+
+    if deltas:
+        pending = session.info.setdefault("category_deltas", {})
+        for category_id, (products, in_stock) in deltas.items():
+            total = pending.setdefault(category_id, [0, 0])
+            total[0] += products
+            total[1] += in_stock
+    if changes:
+        session.info.setdefault("category_changes", {}).update(changes)
+
+
+@event.listens_for(Session, "after_commit")
+def apply_category_changes(session):
+    deltas = session.info.pop("category_deltas", None)
+    changes = session.info.pop("category_changes", None)
+    if deltas or changes:
+        category_registry.apply(deltas or {}, changes or {})
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_category_changes(session):
+    session.info.pop("category_deltas", None)
+    session.info.pop("category_changes", None)
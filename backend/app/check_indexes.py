@@ -0,0 +1,134 @@
+# Verifies that every hot query in main.py / database.py is served by an index
+# Run from backend/app:  python check_indexes.py   (exits with 1 if any query does a full table scan)
+
+import re
+import sys
+from datetime import datetime
+
+from sqlmodel import select
+
+from database import engine, IS_SQLITE, apply_product_search, apply_product_page, encode_cursor
+from migrate import migrate_db
+from db_models import (
+    Customer,
+    Retailer,
+    Wholesaler,
+    Identity,
+    Product,
+    ShoppingCart,
+    ShoppingCartItem,
+    OrderRecords,
+    OrderItem,
+    Feedback,
+    ProductRelation,
+    WholesaleOrder,
+    WholesaleOrderItem,
+    WholesalerProduct,
+    VerificationOTP,
+    PasswordReset
+)
+
+# Sample values only fill the bind parameters, the plan does not depend on them
+MAIL = "someone@example.com"
+
+# A /products page after the first one (keyset cursor on the sort key + id)
+def page(statement, sort_by):
+    cursor = encode_cursor({"sort": sort_by, "id": 1000, "price": 250.0, "rating_avg": 4.0})
+    return apply_product_page(statement, sort_by, cursor)[0].limit(51)
+
+
+HOT_QUERIES = {
+    "get_customer_by_email": select(Customer).where(Customer.mail == MAIL),
+    "get_retailer_by_email": select(Retailer).where(Retailer.mail == MAIL),
+    "get_wholesaler_by_email": select(Wholesaler).where(Wholesaler.mail == MAIL),
+    "get_identities_by_email": select(Identity.role, Identity.user_id).where(Identity.mail == MAIL),
+
+    "products page (newest)": page(select(Product), "newest"),
+    "products page (price_low)": page(select(Product), "price_low"),
+    "products page (price_high)": page(select(Product), "price_high"),
+    "products page (rating)": page(select(Product), "rating"),
+    "products page by category (newest)": page(select(Product).where(Product.category_id == 1), "newest"),
+    "products page by category (price_low)": page(select(Product).where(Product.category_id == 1), "price_low"),
+    "products page by category (price_high)": page(select(Product).where(Product.category_id == 1), "price_high"),
+    "products page by category (rating)": page(select(Product).where(Product.category_id == 1), "rating"),
+    "products by price range": select(Product).where(Product.price >= 100).where(Product.price <= 500),
+    "product search (ranked)": apply_product_search(select(Product), "wireless head", rank_results=True),
+    "get_products_by_retailer": select(Product).where(Product.retailer_id == 1),
+    "wholesale shipped merge": select(Product).where(Product.retailer_id == 1).where(Product.name == "Item"),
+
+    "get_cart_by_customer_id": select(ShoppingCart).where(ShoppingCart.customer_id == 1),
+    "get_cart_items": select(ShoppingCartItem).where(ShoppingCartItem.cart_id == 1),
+    "add_item_to_cart existing": select(ShoppingCartItem).where(
+        (ShoppingCartItem.cart_id == 1) & (ShoppingCartItem.product_id == 1)
+    ),
+    "get_detailed_cart_items": select(ShoppingCartItem, Product).where(
+        ShoppingCartItem.cart_id == 1
+    ).join(Product, ShoppingCartItem.product_id == Product.id),
+
+    "customer orders": select(OrderRecords).where(OrderRecords.customer_id == 1).order_by(OrderRecords.order_date.desc()),
+    "order items with names": select(OrderItem, Product.name)
+        .join(Product, Product.id == OrderItem.product_id)
+        .where(OrderItem.orderrecords_id == 1),
+    "retailer order ids": select(OrderItem.orderrecords_id).where(OrderItem.product_id.in_([1, 2, 3])).distinct(),
+
+    "related products": select(Product)
+        .join(ProductRelation, ProductRelation.related_product_id == Product.id)
+        .where(ProductRelation.product_id == 1)
+        .order_by(ProductRelation.rank),
+
+    "product reviews": select(Feedback, Customer.name)
+        .join(Customer, Customer.id == Feedback.customer_id)
+        .where(Feedback.product_id == 1)
+        .order_by(Feedback.created_at.desc()),
+
+    "wholesaler open orders": select(WholesaleOrder).where(
+        (WholesaleOrder.wholesaler_id == 1) & (WholesaleOrder.status.in_(["Pending", "Processing"]))
+    ).order_by(WholesaleOrder.order_date.desc()),
+    "wholesale order items": select(WholesaleOrderItem).where(WholesaleOrderItem.wholesale_order_id == 1),
+    "wholesaler inventory": select(WholesalerProduct).where(WholesalerProduct.wholesaler_id == 1),
+
+    "verification otp": select(VerificationOTP).where(
+        (VerificationOTP.email == MAIL) & (VerificationOTP.otp == "123456")
+    ),
+    "password reset otp": select(PasswordReset).where(
+        (PasswordReset.email == MAIL) & (PasswordReset.otp == "123456")
+    ),
+    # One batch of the OTP sweeper (otp_store.py)
+    "expired verification otps": select(VerificationOTP.id).where(VerificationOTP.expires_at < datetime(2025, 1, 1)).limit(1000),
+    "expired password reset otps": select(PasswordReset.id).where(PasswordReset.expires_at < datetime(2025, 1, 1)).limit(1000),
+}
+
+# "SCAN product" with no USING clause is a full table scan
+FULL_SCAN = re.compile(r"^SCAN \w+$")
+
+
+def explain(connection, statement):
+    compiled = statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").all()
+    return [row[-1] for row in rows]
+
+
+def check_hot_queries():
+    failures = []
+    with engine.connect() as connection:
+        for name, statement in HOT_QUERIES.items():
+            plan = explain(connection, statement)
+            scans = [step for step in plan if FULL_SCAN.match(step)]
+            status = "FULL SCAN" if scans else "OK"
+            print(f"[{status:9}] {name}")
+            for step in plan:
+                print(f"              {step}")
+            if scans:
+                failures.append(name)
+    return failures
+
+
+if __name__ == "__main__":
+    if not IS_SQLITE:
+        sys.exit("check_indexes.py reads SQLite query plans, run it against the SQLite database")
+    migrate_db()
+    failed = check_hot_queries()
+    if failed:
+        print(f"\n{len(failed)} hot queries are not using an index: {', '.join(failed)}")
+        sys.exit(1)
+    print(f"\nAll {len(HOT_QUERIES)} hot queries use an index.")
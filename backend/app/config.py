@@ -11,4 +11,67 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 MAIL_USERNAME = os.getenv("MAIL_USERNAME")
 MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
 MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
-MAIL_SERVER = os.getenv("MAIL_SERVER")
\ No newline at end of file
+MAIL_SERVER = os.getenv("MAIL_SERVER")
+
+# Database Settings
+# Leave DATABASE_URL unset to use the local SQLite file (backend/data/livemart.db)
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Optional comma-separated read replicas of DATABASE_URL for catalog / history reads
+DATABASE_READ_URLS = [url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()]
+
+# After a client writes, its reads stay on the main database for this many seconds (replica lag cover)
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+
+# "development" keeps SQL echo on for debugging, "production" turns it off and sizes the pool (and SQLite) for concurrent load
+DB_PROFILE = os.getenv("DB_PROFILE", "development")
+
+# DB connections kept in the pool per uvicorn worker (production profile). Every worker holds its own
+# pool, so keep workers x DB_POOL_SIZE below PostgreSQL's max_connections (100 by default)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+
+# Seconds a request waits for a free pooled connection, and max age of a connection (PostgreSQL)
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+# /products response cache (per worker): max cached listings and seconds before an entry expires
+LISTING_CACHE_SIZE = int(os.getenv("LISTING_CACHE_SIZE", 1000))
+LISTING_CACHE_TTL = int(os.getenv("LISTING_CACHE_TTL", 60))
+
+# Seconds between full reloads of the in-memory category registry (picks up other workers' / scripts' writes)
+CATEGORY_REFRESH_SECONDS = int(os.getenv("CATEGORY_REFRESH_SECONDS", 300))
+
+# Category given to products a retailer receives through a shipped wholesale order
+WHOLESALE_DEFAULT_CATEGORY = os.getenv("WHOLESALE_DEFAULT_CATEGORY", "Electronics")
+
+# Responses of at least this many bytes are gzipped (when the client accepts gzip), at this level (1-9)
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", 1000))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 5))
+
+# Seconds between background rebuilds of the /products/suggest prefix index (picks up other workers' / scripts' writes)
+SUGGEST_REFRESH_SECONDS = int(os.getenv("SUGGEST_REFRESH_SECONDS", 600))
+
+# Retailer map index: grid cell size in degrees (0.05 is about 5.5 km) and seconds between full reloads
+RETAILER_GRID_DEGREES = float(os.getenv("RETAILER_GRID_DEGREES", 0.05))
+RETAILER_INDEX_REFRESH_SECONDS = int(os.getenv("RETAILER_INDEX_REFRESH_SECONDS", 300))
+
+# "Frequently bought together": partners kept per product by build_related.py (also the most /related returns)
+RELATED_PRODUCTS_TOP_K = int(os.getenv("RELATED_PRODUCTS_TOP_K", 10))
+
+# Accounts behind JWTs cached per worker for the auth dependencies: max cached accounts and seconds before
+# an entry expires (bounds how long another worker's change to an account, e.g. a deletion, goes unnoticed)
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+
+# Password hashing: processes in the hashing pool, and the scrypt cost of new hashes (n = 2 ** LOG_N).
+# Raising the cost upgrades each account's hash at its next login.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+PASSWORD_SCRYPT_LOG_N = int(os.getenv("PASSWORD_SCRYPT_LOG_N", 14))
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", 8))
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", 1))
+
+# One-time codes: "db" (tables shared by all workers) or "memory" (this process only, single worker setups),
+# how often expired codes are deleted, and how many rows each delete removes ("db")
+OTP_STORE = os.getenv("OTP_STORE", "db")
+OTP_SWEEP_SECONDS = int(os.getenv("OTP_SWEEP_SECONDS", 300))
+OTP_SWEEP_BATCH = int(os.getenv("OTP_SWEEP_BATCH", 1000))
@@ -0,0 +1,138 @@
+# Per-table version counters for ETag / Last-Modified on catalog endpoints
+#
+# The dataversion table holds one row per versioned table (see VERSIONED_MODELS). Once a transaction
+# that changes one of those tables has committed, its row is bumped (version + 1, updated_at = now) in
+# a short transaction of its own, so the counter moves on every worker and on every replica. The bump
+# is kept out of the writer's transaction because every checkout changes product stock: holding the
+# one 'product' row lock until each checkout commits would make them all wait on each other. A
+# response built between a commit and its bump carries the previous ETag, so the next request for
+# it gets the full response again.
+# Endpoints read the counters first (a primary-key lookup), answer If-None-Match with 304 when
+# nothing changed, and only run their own query otherwise.
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from sqlalchemy import event, inspect, update
+from sqlmodel import Session, select, col
+
+from db_models import DataVersion, Product, Category, Feedback, Retailer, Customer, ProductRelation
+
+# Model -> (dataversion row, columns that count as a change; None = any column)
+VERSIONED_MODELS = {
+    Product: ("product", None),
+    Category: ("category", None),
+    Feedback: ("feedback", None),
+    Retailer: ("retailer", None),
+    Customer: ("customer", ("name",)),     # Only the name is shown in catalog responses (review authors)
+    ProductRelation: ("product_relation", None),
+}
+
+
+def bump_data_versions(connection, names):
+    connection.execute(
+        update(DataVersion)
+        .where(col(DataVersion.name).in_(sorted(names)))
+        .values(version=DataVersion.version + 1, updated_at=datetime.utcnow())
+    )
+
+
+# -----------------------------------------------------------------
+# Change Tracking
+# -----------------------------------------------------------------
+
+def _changed(obj):
+    versioned = VERSIONED_MODELS.get(type(obj))
+    if versioned is None:
+        return None
+    name, columns = versioned
+    if columns is None:
+        return name
+    state = inspect(obj)
+    if any(state.attrs[column].history.has_changes() for column in columns):
+        return name
+    return None
+
+
+def _collect(session, names):
+    if names:
+        session.info.setdefault("changed_tables", set()).update(names)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_flushed_tables(session, flush_context):
+    names = {_changed(obj) for obj in session.new}
+    names.update(_changed(obj) for obj in session.deleted)
+    names.update(_changed(obj) for obj in session.dirty if session.is_modified(obj))
+    names.discard(None)
+    _collect(session, names)
+
+
+# Bulk UPDATE / DELETE statements (e.g. delete(Feedback).where(...)) do not go through the flush
+@event.listens_for(Session, "do_orm_execute")
+def collect_statement_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        versioned = VERSIONED_MODELS.get(mapper.class_) if mapper is not None else None
+        if versioned is not None:
+            _collect(orm_execute_state.session, {versioned[0]})
+
+
+@event.listens_for(Session, "after_commit")
+def bump_changed_tables(session):
+    names = session.info.pop("changed_tables", None)
+    if names:
+        try:
+            with session.get_bind().begin() as connection:
+                bump_data_versions(connection, names)
+        except Exception as e:
+            # The data is committed; clients holding the previous ETag keep it until the next bump
+            print(f"DATA VERSION BUMP ERROR: {str(e)}")
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_changed_tables(session):
+    session.info.pop("changed_tables", None)
+
+
+# -----------------------------------------------------------------
+# Conditional GET
+# -----------------------------------------------------------------
+
+async def get_data_versions(session, *names) -> list:
+    statement = select(DataVersion).where(col(DataVersion.name).in_(names)).order_by(DataVersion.name)
+    return (await session.exec(statement)).all()
+
+
+# ETag (weak: the same data may be sent gzipped or not), Last-Modified, and no-cache so browsers
+# revalidate every time instead of guessing a freshness lifetime from Last-Modified
+def version_headers(versions) -> dict:
+    tag = "-".join(str(version.version) for version in versions)
+    headers = {"ETag": f'W/"{tag}"', "Cache-Control": "no-cache"}
+    if versions:
+        last_modified = max(version.updated_at for version in versions)
+        headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+# If-None-Match wins over If-Modified-Since when both are sent (RFC 9110). If-Modified-Since is only
+# used when there is no ETag: dates have one-second resolution, so a write in the same second as the
+# earlier response would go unnoticed.
+def is_not_modified(request, headers: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and "ETag" in headers:
+        etag = _opaque(headers["ETag"])
+        return any(tag.strip() == "*" or _opaque(tag) == etag for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and "ETag" not in headers and "Last-Modified" in headers:
+        try:
+            return parsedate_to_datetime(headers["Last-Modified"]) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
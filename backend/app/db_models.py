@@ -3,6 +3,7 @@
 # Here, we define all the database tables, attributes to each
 
 from sqlmodel import SQLModel , Field, Relationship
+from sqlalchemy import Index
 from typing import Optional ,List  # To allow fields to be NULL
 from datetime import datetime # Default timestamps
 from pathlib import Path
@@ -41,7 +42,7 @@ class Customer(SQLModel , table=True):
 
     # Personal Details
     name: str
-    mail: str
+    mail: str = Field(index=True)   # Looked up on every authenticated request
     hashed_password: str  # Hashed password for secure authenticaion
     profile_pic : Optional[str] = Field(default=default_pfp_path)
 
@@ -75,7 +76,7 @@ class Retailer(SQLModel , table=True):
     id: Optional[int] = Field(default=None , primary_key=True)
 
     name: str
-    mail : str
+    mail : str = Field(index=True)
     hashed_password : str
     profile_pic : Optional[str] = Field(default=default_pfp_path)
 
@@ -113,7 +114,7 @@ class Wholesaler(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
 
     name: str
-    mail: str
+    mail: str = Field(index=True)
     hashed_password: str
     profile_pic : Optional[str] = Field(default=default_pfp_path)
 
@@ -147,6 +148,11 @@ class Wholesaler(SQLModel, table=True):
 # --------------------------------------------------------------------------------------------------------------------
 class WholesaleOrder(SQLModel, table=True):
 
+    # Wholesaler dashboard lists orders newest first
+    __table_args__ = (
+        Index("ix_wholesaleorder_wholesaler_id_order_date", "wholesaler_id", "order_date"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     
     # Retailer --> Customer
@@ -166,7 +172,7 @@ class WholesaleOrder(SQLModel, table=True):
 # --- Wholesaler Specific Inventory ---
 class WholesalerProduct(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    wholesaler_id: int = Field(foreign_key="wholesaler.id")
+    wholesaler_id: int = Field(foreign_key="wholesaler.id", index=True)
     name: str
     price: float  # Bulk price per unit
     stock: int    # Total units available
@@ -182,17 +188,11 @@ class WholesalerProduct(SQLModel, table=True):
 class WholesaleOrderItem(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    wholesale_order_id: int = Field(foreign_key="wholesaleorder.id")
-    
-    # This could link to the main Product table OR a separate WholesalerProduct table
-    # For simplicity in your project, let's link to a main product.
-    # This implies wholesalers and retailers sell from the same product catalog,
-    # which might be an assumption you make.
-    #
-    # A better model for proxy stock (source 44) would be a separate
-    # 'WholesalerProduct' table, but let's keep it simpler for now.
+    wholesale_order_id: int = Field(foreign_key="wholesaleorder.id", index=True)
     
-    product_id: int = Field(foreign_key="product.id")
+    # Wholesale orders are placed against the wholesaler's inventory (WholesalerProduct), not the retail catalog.
+    # SQLite never enforced this key; PostgreSQL does, so it must point at the table the ids come from.
+    product_id: int = Field(foreign_key="wholesalerproduct.id")
     quantity: int
     price_per_unit: float
     
@@ -203,6 +203,17 @@ class WholesaleOrderItem(SQLModel, table=True):
 
 class Product(SQLModel , table=True):
 
+    __table_args__ = (
+        # Keyset pages of /products: every sort ends in id, so (sort key, id) resumes exactly after the cursor
+        Index("ix_product_category_id_id", "category_id", "id"),                  # category, newest first
+        Index("ix_product_category_id_price_id", "category_id", "price", "id"),   # category, by price
+        Index("ix_product_price_id", "price", "id"),                              # whole catalog / price range, by price
+        Index("ix_product_category_id_rating_avg_id", "category_id", "rating_avg", "id"),  # category, top rated
+        Index("ix_product_rating_avg_id", "rating_avg", "id"),                    # whole catalog, top rated
+        # Retailer listings and the wholesale "Shipped" stock merge by name
+        Index("ix_product_retailer_id_name", "retailer_id", "name"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     
     name: str
@@ -212,6 +223,12 @@ class Product(SQLModel , table=True):
 
     price: float
     stock: int
+
+    # Review aggregates, moved by each new review in its own transaction (database.record_product_rating)
+    # and recomputed from Feedback by database.backfill_product_ratings
+    rating_sum: int = Field(default=0)
+    rating_count: int = Field(default=0)
+    rating_avg: float = Field(default=0)   # rating_sum / rating_count, stored so /products can sort and filter on it
     
     image_url: Optional[str] = Field(default=default_product_image)
     cart_items: List["ShoppingCartItem"] = Relationship(back_populates="product")
@@ -237,7 +254,7 @@ class ShoppingCart(SQLModel , table=True):
     id: Optional[int] = Field(default=None , primary_key=True)
     items: List["ShoppingCartItem"] = Relationship(back_populates="shopping_cart")
     # Refers to the Customer using this cart
-    customer_id: int = Field(foreign_key="customer.id")
+    customer_id: int = Field(foreign_key="customer.id", index=True)
 
 
 
@@ -247,6 +264,11 @@ class ShoppingCart(SQLModel , table=True):
 
 class ShoppingCartItem(SQLModel , table = True):
 
+    # Cart listing (cart_id) and the add-to-cart duplicate check (cart_id, product_id)
+    __table_args__ = (
+        Index("ix_shoppingcartitem_cart_id_product_id", "cart_id", "product_id"),
+    )
+
     id: Optional[int] = Field(default=None , primary_key=True)
     product_id: int = Field(foreign_key="product.id")
     quantity: int
@@ -268,6 +290,11 @@ class ShoppingCartItem(SQLModel , table = True):
 # Keeps a record of all orders that went through
 class OrderRecords(SQLModel , table=True):
 
+    # Customer order history, newest first
+    __table_args__ = (
+        Index("ix_orderrecords_customer_id_order_date", "customer_id", "order_date"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     customer_id: int = Field(foreign_key="customer.id")
 
@@ -289,6 +316,13 @@ class OrderRecords(SQLModel , table=True):
 # --------------------------------------------------------------------------------------------------------------------
 class OrderItem(SQLModel, table=True):
 
+    __table_args__ = (
+        # Items of one order
+        Index("ix_orderitem_orderrecords_id_product_id", "orderrecords_id", "product_id"),
+        # Covering index for "which orders contain these products" (retailer order listing)
+        Index("ix_orderitem_product_id_orderrecords_id", "product_id", "orderrecords_id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     orderrecords_id: int = Field(foreign_key="orderrecords.id")
     product_id: int = Field(foreign_key="product.id")
@@ -305,6 +339,11 @@ class OrderItem(SQLModel, table=True):
 # --------------------------------------------------------------------------------------------------------------------
 class Feedback(SQLModel, table=True):
 
+    # Product reviews, newest first
+    __table_args__ = (
+        Index("ix_feedback_product_id_created_at", "product_id", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     product_id: int = Field(foreign_key="product.id")
     customer_id: int = Field(foreign_key="customer.id")
@@ -324,10 +363,58 @@ class PasswordReset(SQLModel , table=True):
     id : Optional[int] = Field(default=None , primary_key=True)
     email: str = Field(index=True)
     otp:str
-    expires_at : datetime
+    expires_at : datetime = Field(index=True)     # Expired codes are swept by otp_store.py
     
 class VerificationOTP(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     email: str = Field(index=True)
     otp: str
-    expires_at: datetime
\ No newline at end of file
+    expires_at: datetime = Field(index=True)
+
+
+# --------------------------------------------------------------------------------------------------------------------
+# Product Relation ("frequently bought together": the top products ordered together with each product,
+# rebuilt from OrderItem by build_related.py; /products/{id}/related reads one primary-key range)
+# --------------------------------------------------------------------------------------------------------------------
+
+class ProductRelation(SQLModel, table=True):
+    product_id: int = Field(foreign_key="product.id", primary_key=True)
+    rank: int = Field(primary_key=True)                     # 1 = ordered together most often
+    related_product_id: int = Field(foreign_key="product.id")
+    orders: int                                             # Orders that contain both products
+
+
+# --------------------------------------------------------------------------------------------------------------------
+# Identity (one row per account of any role, so an email resolves to its accounts in one indexed query;
+# kept in step with Customer / Retailer / Wholesaler by identities.py)
+# --------------------------------------------------------------------------------------------------------------------
+
+class Identity(SQLModel, table=True):
+    __table_args__ = (
+        # Covering index: email -> (role, id) without touching the table
+        Index("ix_identity_mail_role_user_id", "mail", "role", "user_id"),
+    )
+
+    role: str = Field(primary_key=True)         # "customer", "retailer" or "wholesaler"
+    user_id: int = Field(primary_key=True)      # id in that role's table
+    mail: str
+
+
+# --------------------------------------------------------------------------------------------------------------------
+# Schema Version (one row per applied migration, see migrate.py)
+# --------------------------------------------------------------------------------------------------------------------
+
+class SchemaVersion(SQLModel, table=True):
+    version: int = Field(primary_key=True)     # Number from the migration file name (v0002_... -> 2)
+    name: str                                  # Migration module name, e.g. "v0002_hot_indexes"
+    applied_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+
+
+# --------------------------------------------------------------------------------------------------------------------
+# Data Version (one row per catalog table, bumped by every commit that changes it, see data_versions.py)
+# --------------------------------------------------------------------------------------------------------------------
+
+class DataVersion(SQLModel, table=True):
+    name: str = Field(primary_key=True)        # Table name, e.g. "product"
+    version: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
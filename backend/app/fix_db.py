@@ -1,6 +1,9 @@
-from sqlmodel import Session, delete
+from sqlmodel import Session, delete, select, col
 from database import engine
-from db_models import Customer, Retailer, Wholesaler
+from db_models import (
+    Customer, Retailer, Wholesaler, Identity,
+    Product, ProductRelation, Feedback, ShoppingCartItem, OrderItem, OrderRecords,
+)
 
 def clear_users():
     with Session(engine) as session:
@@ -8,9 +11,51 @@ def clear_users():
         session.exec(delete(Customer))
         session.exec(delete(Retailer))
         session.exec(delete(Wholesaler))
+        session.exec(delete(Identity))
         
         session.commit()
         print("All user accounts have been cleared.")
 
+# Deletes the products no order or review refers to (every retailer's, or only 'retailer_id's), with
+# the relations and cart items that point at them. Products with history are kept, so no customer's
+# orders or reviews are lost. Returns (deleted, kept).
+def clear_unused_products(retailer_id=None):
+    with Session(engine) as session:
+        products = select(Product.id)
+        if retailer_id is not None:
+            products = products.where(Product.retailer_id == retailer_id)
+        unused = (
+            products
+            .where(col(Product.id).not_in(select(OrderItem.product_id)))
+            .where(col(Product.id).not_in(select(Feedback.product_id)))
+        )
+        total = len(session.exec(products).all())
+        deleted = len(session.exec(unused).all())
+
+        # Rows that reference a product go first (PostgreSQL enforces the foreign keys)
+        session.exec(delete(ProductRelation).where(col(ProductRelation.product_id).in_(unused)))
+        session.exec(delete(ProductRelation).where(col(ProductRelation.related_product_id).in_(unused)))
+        session.exec(delete(ShoppingCartItem).where(col(ShoppingCartItem.product_id).in_(unused)))
+        session.exec(delete(Product).where(col(Product.id).in_(unused)))
+
+        session.commit()
+        print(f"Cleared {deleted} products; kept {total - deleted} that have orders or reviews.")
+        return deleted, total - deleted
+
+# Every product, and with them every review, cart item, relation and order (whole order history)
+def clear_products():
+    with Session(engine) as session:
+        # Rows that reference a product go first (PostgreSQL enforces the foreign keys),
+        # and orders go with their items
+        session.exec(delete(ProductRelation))
+        session.exec(delete(Feedback))
+        session.exec(delete(ShoppingCartItem))
+        session.exec(delete(OrderItem))
+        session.exec(delete(OrderRecords))
+        session.exec(delete(Product))
+
+        session.commit()
+        print("All products, with their reviews, cart items and orders, have been cleared.")
+
 if __name__ == "__main__":
-    clear_users()
\ No newline at end of file
+    clear_users()
@@ -0,0 +1,276 @@
+# Deterministic synthetic data for benchmarks and production-scale testing
+# Run from backend/app, e.g.:
+#     python generate_data.py --products 1000000 --customers 200000 --orders 1000000 --feedback 500000
+# The same --seed on an empty database always produces the same rows. Data is appended to what exists.
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, select
+
+from database import (
+    engine,
+    sync_id_sequence,
+    get_next_id,
+    bulk_insert,
+    bulk_insert_products,
+    bulk_insert_customers,
+    bulk_insert_orders,
+    bulk_insert_feedback
+)
+from db_models import Category, Retailer, Customer, Product, OrderRecords
+from migrate import migrate_db
+from auth import hash_password
+from populate_db import POOLS, CATEGORY_IDS
+from placeholder_images import generate_images
+
+# Price range per category (same as populate_db.py)
+PRICE_RANGES = {
+    "Electronics": (2000, 80000),
+    "Fashion": (500, 5000),
+    "Groceries": (50, 800),
+    "Books": (200, 1500),
+    "Home": (500, 10000),
+    "Sports": (300, 5000),
+}
+
+# (city, state, pincode prefix, lat, lon)
+CITIES = [
+    ("Hyderabad", "Telangana", "500", 17.385, 78.4867),
+    ("Bengaluru", "Karnataka", "560", 12.9716, 77.5946),
+    ("Mumbai", "Maharashtra", "400", 19.076, 72.8777),
+    ("Delhi", "Delhi", "110", 28.7041, 77.1025),
+    ("Chennai", "Tamil Nadu", "600", 13.0827, 80.2707),
+    ("Pune", "Maharashtra", "411", 18.5204, 73.8567),
+    ("Kolkata", "West Bengal", "700", 22.5726, 88.3639),
+    ("Jaipur", "Rajasthan", "302", 26.9124, 75.7873),
+]
+
+FIRST_NAMES = ["Aarav", "Vivaan", "Aditya", "Vihaan", "Arjun", "Sai", "Reyansh", "Krishna", "Ishaan", "Rohan",
+               "Ananya", "Diya", "Aadhya", "Saanvi", "Pari", "Anika", "Navya", "Meera", "Riya", "Kavya"]
+LAST_NAMES = ["Sharma", "Verma", "Reddy", "Iyer", "Patel", "Gupta", "Nair", "Rao", "Singh", "Das",
+              "Mehta", "Joshi", "Kulkarni", "Menon", "Chopra", "Bose", "Pillai", "Agarwal", "Khan", "Shah"]
+
+REVIEW_COMMENTS = {
+    1: ["Stopped working after a week.", "Not as described.", "Very poor quality."],
+    2: ["Below expectations.", "Packaging was damaged.", "Overpriced for what it is."],
+    3: ["Okay for the price.", "Average product.", "Does the job."],
+    4: ["Good quality, quick delivery.", "Happy with the purchase.", "Works well."],
+    5: ["Excellent, highly recommend!", "Exactly what I needed.", "Great value for money."],
+}
+
+# Realistic skews: most orders are finished, most reviews are positive
+ORDER_STATUSES = (["Delivered"] * 70) + (["Shipped"] * 15) + (["Processing"] * 5) + (["Pending"] * 10)
+RATINGS = [1] * 5 + [2] * 7 + [3] * 15 + [4] * 33 + [5] * 40
+
+DEFAULT_PASSWORD = "password123"
+
+
+def pick_location(rng):
+    city, state, pin_prefix, lat, lon = rng.choice(CITIES)
+    return {
+        "city": city,
+        "state": state,
+        "pincode": f"{pin_prefix}{rng.randint(1, 99):03d}",
+        "lat": round(lat + rng.uniform(-0.15, 0.15), 6),
+        "lon": round(lon + rng.uniform(-0.15, 0.15), 6),
+    }
+
+
+def random_date(rng, start, end):
+    return start + timedelta(seconds=rng.randint(0, int((end - start).total_seconds())))
+
+
+# -----------------------------------------------------------------
+# Row Generators (each yields plain dicts for the bulk_insert_* helpers)
+# -----------------------------------------------------------------
+
+def generate_retailers(rng, count, first_id, hashed_password, joined):
+    for retailer_id in range(first_id, first_id + count):
+        location = pick_location(rng)
+        yield {
+            "id": retailer_id,
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "mail": f"retailer{retailer_id}@example.com",
+            "hashed_password": hashed_password,
+            "date_joined": joined,
+            "business_name": f"{rng.choice(LAST_NAMES)} Stores #{retailer_id}",
+            "address": f"{rng.randint(1, 999)} Market Road",
+            "is_active": True,
+            "is_verified": True,
+            **location,
+        }
+
+
+def generate_customers(rng, count, first_id, hashed_password, start, end):
+    for customer_id in range(first_id, first_id + count):
+        location = pick_location(rng)
+        yield {
+            "id": customer_id,
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "mail": f"customer{customer_id}@example.com",
+            "hashed_password": hashed_password,
+            "date_joined": random_date(rng, start, end),
+            "delivery_address": f"{rng.randint(1, 999)} Main Street",
+            "phone_number": f"9{rng.randint(100000000, 999999999)}",
+            "is_verified": True,
+            **location,
+        }
+
+
+def generate_products(rng, count, first_id, retailer_ids, image_format):
+    categories = list(POOLS)
+    for product_id in range(first_id, first_id + count):
+        cat_name = rng.choice(categories)
+        pool = POOLS[cat_name]
+        name = f"{rng.choice(pool['brands'])} {rng.choice(pool['adjectives'])} {rng.choice(pool['nouns'])} {product_id}"
+        low, high = PRICE_RANGES[cat_name]
+        yield {
+            "id": product_id,
+            "name": name,
+            "description": f"High quality {name} in {cat_name} category.",
+            "category_id": CATEGORY_IDS[cat_name],
+            "price": round(rng.uniform(low, high), 2),
+            "stock": 0 if rng.random() < 0.08 else rng.randint(5, 150),
+            "retailer_id": rng.choice(retailer_ids),
+            "image_url": f"product_images/{product_id}.{image_format}",
+        }
+
+
+def generate_orders(rng, count, first_id, customers, products, start, end):
+    customer_ids = list(customers)
+    product_ids = list(products)
+    for order_id in range(first_id, first_id + count):
+        customer_id = rng.choice(customer_ids)
+        city, pincode = customers[customer_id]
+        items = []
+        total_price = 0.0
+        for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(1, 4))):
+            quantity = rng.randint(1, 3)
+            price = products[product_id]
+            items.append({"product_id": product_id, "quantity": quantity, "price_at_purchase": price})
+            total_price += price * quantity
+
+        status = rng.choice(ORDER_STATUSES)
+        payment_mode = "Online" if rng.random() < 0.7 else "COD"
+        paid = payment_mode == "Online" or status == "Delivered"
+        yield {
+            "id": order_id,
+            "customer_id": customer_id,
+            "order_date": random_date(rng, start, end),
+            "status": status,
+            "shipping_address": f"{rng.randint(1, 999)} Main Street",
+            "shipping_city": city or "Hyderabad",
+            "shipping_pincode": pincode or "500001",
+            "total_price": round(total_price, 2),
+            "payment_mode": payment_mode,
+            "payment_status": "Paid" if paid else "Pending",
+            "items": items,
+        }
+
+
+def generate_feedback(rng, count, customer_ids, product_ids, start, end):
+    for _ in range(count):
+        rating = rng.choice(RATINGS)
+        yield {
+            "product_id": rng.choice(product_ids),
+            "customer_id": rng.choice(customer_ids),
+            "rating": rating,
+            "comment": rng.choice(REVIEW_COMMENTS[rating]),
+            "created_at": random_date(rng, start, end),
+        }
+
+
+# -----------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------
+
+def ensure_categories():
+    with Session(engine) as session:
+        for name, cat_id in CATEGORY_IDS.items():
+            if not session.get(Category, cat_id):
+                session.add(Category(id=cat_id, name=name, description=f"All {name}"))
+        session.flush()
+        sync_id_sequence(session.connection(), "category")
+        session.commit()
+
+
+def timed(label, insert, rows):
+    started = time.perf_counter()
+    count = insert(rows)
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed else float("inf")
+    print(f" - {label}: {count:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+    return count
+
+
+def generate(args):
+    rng = random.Random(args.seed)
+    end = datetime.fromisoformat(args.until)
+    start = end - timedelta(days=365)
+    hashed_password = hash_password(DEFAULT_PASSWORD)  # one hash, shared by every generated account
+
+    migrate_db()
+    ensure_categories()
+    print(f"--- Generating data (seed {args.seed}) ---")
+
+    if args.retailers:
+        first_id = get_next_id(Retailer)
+        timed("retailers", lambda rows: bulk_insert(Retailer, rows),
+              generate_retailers(rng, args.retailers, first_id, hashed_password, start))
+    if args.customers:
+        timed("customers", bulk_insert_customers,
+              generate_customers(rng, args.customers, get_next_id(Customer), hashed_password, start, end))
+
+    with Session(engine) as session:
+        retailer_ids = session.exec(select(Retailer.id).order_by(Retailer.id)).all()
+    if args.products:
+        if not retailer_ids:
+            raise SystemExit("Products need at least one retailer, use --retailers")
+        first_id = get_next_id(Product)
+        timed("products", bulk_insert_products,
+              generate_products(rng, args.products, first_id, retailer_ids, args.image_format))
+        if args.images:
+            with Session(engine) as session:
+                generate_images(session.exec(
+                    select(Product.image_url, Product.name).where(Product.id >= first_id).order_by(Product.id)
+                ).all(), workers=args.workers)
+
+    # Orders and reviews reference every customer / product in the database, not only the new ones
+    if args.orders or args.feedback:
+        with Session(engine) as session:
+            customers = {
+                customer_id: (city, pincode)
+                for customer_id, city, pincode in session.exec(
+                    select(Customer.id, Customer.city, Customer.pincode).order_by(Customer.id)
+                )
+            }
+            products = dict(session.exec(select(Product.id, Product.price).order_by(Product.id)).all())
+        if not customers or not products:
+            raise SystemExit("Orders and feedback need existing customers and products")
+
+        if args.orders:
+            timed("orders", bulk_insert_orders,
+                  generate_orders(rng, args.orders, get_next_id(OrderRecords), customers, products, start, end))
+        if args.feedback:
+            timed("feedback", bulk_insert_feedback,
+                  generate_feedback(rng, args.feedback, list(customers), list(products), start, end))
+
+    print(f"--- Done. Generated accounts use the password '{DEFAULT_PASSWORD}' ---")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a large, reproducible dataset")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--retailers", type=int, default=50)
+    parser.add_argument("--customers", type=int, default=10000)
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--feedback", type=int, default=50000)
+    parser.add_argument("--images", action="store_true", help="Also render a placeholder image for every new product")
+    parser.add_argument("--image-format", choices=["jpg", "webp"], default="jpg")
+    parser.add_argument("--workers", type=int, default=None, help="Image rendering processes (default: all CPUs)")
+    parser.add_argument("--until", default="2025-12-31", help="Newest order / review date (ISO), data spans the year before")
+    generate(parser.parse_args())
@@ -0,0 +1,63 @@
+# Email -> account index across Customer, Retailer and Wholesaler (the identity table)
+#
+# Verification, password reset and Google login find accounts by email without knowing the role. The
+# identity table holds (role, id, email) for every account, so that is one indexed query instead of a
+# probe of each account table in turn. The session events below keep it in step, in the same
+# transaction, with accounts created, deleted or given a new email through the ORM. Writes that skip
+# the ORM (bulk_insert, migration v0008) rebuild the rows with sync_identities.
+
+from sqlalchemy import event, inspect, delete, update, literal, and_
+from sqlmodel import Session
+
+from db_models import Customer, Retailer, Wholesaler, Identity
+
+# Role name -> account model, in the order an email registered under several roles is resolved
+ROLE_MODELS = {"customer": Customer, "retailer": Retailer, "wholesaler": Wholesaler}
+MODEL_ROLES = {model: role for role, model in ROLE_MODELS.items()}
+
+
+# Replaces the identity rows of the given roles (all by default) with the account tables' contents
+def sync_identities(connection, roles=None):
+    for role in roles or ROLE_MODELS:
+        model = ROLE_MODELS[role]
+        connection.execute(delete(Identity).where(Identity.role == role))
+        connection.execute(
+            Identity.__table__.insert().from_select(
+                ["role", "user_id", "mail"], model.__table__.select().with_only_columns(literal(role), model.id, model.mail)
+            )
+        )
+
+
+# -----------------------------------------------------------------
+# Write-Driven Updates
+# -----------------------------------------------------------------
+# after_flush sees the pre-flush new / dirty / deleted sets with ids already assigned, and the
+# identity rows are written on the flush's own connection, so they commit or roll back with it.
+
+def _key(role, obj):
+    return and_(Identity.role == role, Identity.user_id == obj.id)
+
+
+@event.listens_for(Session, "after_flush")
+def sync_flushed_identities(session, flush_context):
+    added = []
+    statements = []
+    for obj in session.new:
+        role = MODEL_ROLES.get(type(obj))
+        if role is not None:
+            added.append({"role": role, "user_id": obj.id, "mail": obj.mail})
+    for obj in session.dirty:
+        role = MODEL_ROLES.get(type(obj))
+        if role is not None and inspect(obj).attrs.mail.history.has_changes():
+            statements.append(update(Identity).where(_key(role, obj)).values(mail=obj.mail))
+    for obj in session.deleted:
+        role = MODEL_ROLES.get(type(obj))
+        if role is not None:
+            statements.append(delete(Identity).where(_key(role, obj)))
+
+    if added or statements:
+        connection = session.connection()
+        if added:
+            connection.execute(Identity.__table__.insert(), added)
+        for statement in statements:
+            connection.execute(statement)
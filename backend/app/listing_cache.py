@@ -0,0 +1,126 @@
+# Cache of serialized /products responses (LRU + TTL), invalidated by product writes
+#
+# Each entry belongs to the category it was filtered on (None = spans every category). When a
+# transaction that changed products commits, the session events below drop exactly the entries for
+# the touched categories plus the unfiltered ones, so adding / editing / deleting a product, checkout
+# stock changes and wholesale stock merges are visible on the next request.
+# The cache is per worker process: main.py puts the data version in each key, so other workers' writes
+# make entries miss. LISTING_CACHE_TTL bounds how stale a replica-served entry can be.
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlmodel import Session
+
+from config import LISTING_CACHE_SIZE, LISTING_CACHE_TTL
+from db_models import Product
+
+
+class ListingCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()     # key -> (expires_at, category_id, value), oldest first
+        self._lock = threading.Lock()
+        # Bumped on every invalidation. A listing computed while a write committed may be stale,
+        # so put() only stores it if the generation is still the one seen before the query ran.
+        self.generation = 0
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.counters["expirations"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return value
+
+    def put(self, key, category_id, value, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, category_id, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def invalidate_categories(self, category_ids):
+        with self._lock:
+            self.generation += 1
+            stale = [
+                key for key, (_, category_id, _) in self._entries.items()
+                if category_id is None or category_id in category_ids
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.counters["invalidations"] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else None,
+                **self.counters,
+            }
+
+
+product_listing_cache = ListingCache(LISTING_CACHE_SIZE, LISTING_CACHE_TTL)
+
+
+# -----------------------------------------------------------------
+# Write-Driven Invalidation
+# -----------------------------------------------------------------
+# Collect the categories of every product the transaction inserts, changes or deletes (old and new
+# category when a product moves), then invalidate once the commit has succeeded.
+
+def _product_categories(session):
+    changed = set()
+    for obj in session.new:
+        if isinstance(obj, Product):
+            changed.add(obj.category_id)
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            changed.add(obj.category_id)
+    for obj in session.dirty:
+        if isinstance(obj, Product) and session.is_modified(obj):
+            changed.add(obj.category_id)
+            changed.update(inspect(obj).attrs.category_id.history.deleted)
+    return changed
+
+
+@event.listens_for(Session, "before_flush")
+def collect_changed_categories(session, flush_context, instances):
+    changed = _product_categories(session)
+    if changed:
+        session.info.setdefault("changed_categories", set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_changed_categories(session):
+    changed = session.info.pop("changed_categories", None)
+    if changed:
+        product_listing_cache.invalidate_categories(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_changed_categories(session):
+    session.info.pop("changed_categories", None)
@@ -1,23 +1,26 @@
 # App
 
 # Importing FastAPI
-from fastapi import FastAPI , HTTPException , status, Depends, Form , BackgroundTasks,UploadFile,File
+from fastapi import FastAPI , HTTPException , status, Depends, Form , BackgroundTasks,UploadFile,File, Query, Response
 
 from typing import List, Annotated, Optional 
-from pydantic import BaseModel 
+from pydantic import BaseModel, TypeAdapter
 import shutil 
+import asyncio
 import uuid 
 from fastapi.staticfiles import StaticFiles
 
 from sqlmodel import Session, select, or_ , col
+from sqlmodel.ext.asyncio.session import AsyncSession
 from contextlib import asynccontextmanager
 
-from fastapi.concurrency import run_in_threadpool
 
 # Add datetime for Google Auth
 from datetime import datetime, timedelta
 
 from starlette.middleware.sessions import SessionMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from starlette.requests import Request
 from starlette.responses import RedirectResponse
 import os
@@ -27,8 +30,8 @@ load_dotenv()
 from pydantic import BaseModel # Importing BaseModel for the new Verification Schema
 
 from auth import (
-    hash_password, 
-    verify_password, 
+    hash_password_async,
+    check_password_async,
     create_access_token, 
     get_current_retailer,
     get_current_customer,
@@ -49,7 +52,6 @@ from auth import (
 
 # Importing custom-built database models and functions
 from database import (
-    create_db_and_tables,
     add_customer,
     add_product,
     add_retailer,
@@ -61,11 +63,17 @@ from database import (
     get_customer_by_email,
     get_retailer_by_email,
     get_wholesaler_by_email,
+    get_identities_by_email,
+    get_accounts_by_email,
+    upgrade_password_hash,
     get_cart_by_customer_id,
     get_detailed_cart_items,
     process_checkout,
     get_products_by_retailer,
     get_product_by_id,
+    get_related_products,
+    get_by_ids,
+    get_products_by_ids,
     update_product_details,
     get_orders_by_retailer,
     get_order_by_id,
@@ -75,7 +83,18 @@ from database import (
     save_verification_otp, # <--- NEW
     verify_user_account,   # <--- NEW
 
-    engine
+    engine,
+    async_session,
+    get_session,
+    get_read_session,
+    filter_products,
+    get_product_facets,
+    apply_product_page,
+    next_product_cursor,
+    PRODUCT_PAGE_ORDER,
+    add_feedback,
+    get_pool_status,
+    UnitOfWorkRoute
 )
 
 # Importing the SQLModel classes
@@ -97,6 +116,32 @@ from db_models import (Customer,
                     
                         )
 
+# Schema migrations
+from migrate import migrate_db
+
+# /products response cache (also registers the session events that invalidate it)
+from listing_cache import product_listing_cache
+from principal_cache import principal_cache
+
+# Password hashing process pool (started on first use)
+from passwords import shutdown_password_pool
+
+# One-time codes (verification / password reset) and the sweeper that deletes expired ones
+from otp_store import otp_store, sweep_expired_otps, OTP_INVALID, OTP_EXPIRED
+
+# ETag / Last-Modified from per-table version counters (also registers the session events that bump them)
+from data_versions import get_data_versions, version_headers, is_not_modified
+
+# Categories by name / id with product counts (also registers the session events that keep it current)
+from category_registry import category_registry
+from config import WHOLESALE_DEFAULT_CATEGORY, GZIP_MINIMUM_SIZE, GZIP_LEVEL, RELATED_PRODUCTS_TOP_K
+
+# Search box autocomplete (also registers the session events that keep it current)
+from suggest_index import product_suggest_index, WORD
+
+# Nearest-retailer lookups (also registers the session events that keep it current)
+from retailer_locator import retailer_locator
+
 # Importing the Schemas
 from schemas import *
 
@@ -107,21 +152,61 @@ from fastapi import File , UploadFile
 # Building the App
 # -----------------------------
 
+# Full (re)load of an in-memory index: at startup, and in the background once it is due for a refresh
+def reload_index(index):
+    with Session(engine) as session:
+        index.load(session)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    create_db_and_tables()
+    # Startup (only touches the schema when a new migration is pending)
+    migrate_db()
+    with Session(engine) as session:
+        category_registry.load(session)
+    reload_index(product_suggest_index)
+    reload_index(retailer_locator)
+    otp_sweeper = asyncio.create_task(sweep_expired_otps(async_session))
     yield
+    # Shutdown
+    otp_sweeper.cancel()
+    shutdown_password_pool()
 
+# orjson encodes response bodies several times faster than the standard json module
 app = FastAPI(
     title="Live MART" , 
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Every endpoint shares one DB session per request and commits it once, after the endpoint returns.
+# Read-only catalog / history endpoints use get_read_session instead, which routes to the read engines.
+app.router.route_class = UnitOfWorkRoute
+
 SECRET_KEY = os.getenv("SECRET_KEY", "unsafe-random-string-for-dev")
 app.add_middleware(SessionMiddleware , secret_key = SECRET_KEY)
 
 
+# JSON and the frontend's HTML / JS / CSS are gzipped; images are already compressed, so they are sent as they are
+UNCOMPRESSED_PATHS = ("/product_images/", "/profile_pictures/")
+
+class APIGZipMiddleware(GZipMiddleware):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(UNCOMPRESSED_PATHS):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(APIGZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=GZIP_LEVEL)
+
+
+# Endpoints that already build schema objects return them through schema_response: the adapter writes
+# them to JSON in one step, skipping the response_model validation FastAPI would otherwise run again
+ORDER_LIST = TypeAdapter(List[OrderRecordsRead])
+
+def schema_response(adapter: TypeAdapter, value, headers: dict = None) -> Response:
+    return Response(content=adapter.dump_json(value), media_type="application/json", headers=headers)
+
+
 # Mounting the app to folder at "../data"
 # app.mount("/static" , StaticFiles(directory="../data") , name="static") # Removed relative path causing issues
 
@@ -133,6 +218,16 @@ def root():
     # This will now be overridden by the StaticFiles mount if you have an index.html
     return "Hello Word!"
 
+# Connection pool health (sizes, checked-out connections, connect / invalidation counters)
+@app.get("/health/db", tags=["General"])
+def db_health():
+    return get_pool_status()
+
+# /products listing cache (entries, hit rate, hit / miss / eviction / invalidation counters)
+@app.get("/health/cache", tags=["General"])
+def cache_health():
+    return {**product_listing_cache.stats(), "principals": principal_cache.stats()}
+
 
 
 # -------------------------------------------------------------------------------------------------------------------------------------------------
@@ -143,20 +238,21 @@ def root():
 @app.post("/signup/customer" , response_model=CustomerRead , status_code=status.HTTP_201_CREATED, tags=["Customer Auth"])   # Returns 201 on Success
 async def signup_customer(
     customer : CustomerCreate,
-    background_tasks: BackgroundTasks # <--- NEW: Required for sending email
+    background_tasks: BackgroundTasks, # <--- NEW: Required for sending email
+    session: AsyncSession = Depends(get_session)
 ):
 
     # Check if email already exists
-    exists = await run_in_threadpool(get_customer_by_email, customer.mail)
+    exists = await get_customer_by_email(session, customer.mail)
 
     if exists:
         raise HTTPException(status_code=400 , detail="Email Already Registered")
 
     # Hashing the password
-    hashed_password = hash_password(customer.password)
+    hashed_password = await hash_password_async(customer.password)
 
-    new_customer = await run_in_threadpool(
-        add_customer,
+    new_customer = await add_customer(
+        session,
         customer.name,
         customer.mail,
         hashed_password,
@@ -175,7 +271,7 @@ async def signup_customer(
 
     # --- NEW: Send Verification OTP ---
     otp = generate_otp()
-    await run_in_threadpool(save_verification_otp, customer.mail, otp)
+    await save_verification_otp(session, customer.mail, otp)
     await send_verification_email(customer.mail, otp, background_tasks)
     # ----------------------------------
 
@@ -187,11 +283,12 @@ async def signup_customer(
 # Login Endpoint - POST ---> Accepts JSON Body
 @app.post("/login/customer", response_model=Token, tags=["Customer Auth"])
 async def login_customer(
-    req: LoginRequest
+    req: LoginRequest,
+    session: AsyncSession = Depends(get_session)
 ):
 
     # Checking if customer exists
-    customer = await run_in_threadpool(get_customer_by_email , req.mail)
+    customer = await get_customer_by_email(session, req.mail)
 
     if not customer:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED , detail="Invalid Credentials: Mail not found")
@@ -203,11 +300,16 @@ async def login_customer(
 
     # Checking password
     # Password incorrect
-    if not verify_password(req.password, customer.hashed_password):
+    customer_hash = customer.hashed_password
+    valid, new_hash = await check_password_async(req.password, customer_hash)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED , detail="Invalid Credentials: Password not found")
+    # Hashes in an older format are replaced while the plain password is at hand
+    if new_hash:
+        await upgrade_password_hash(session, customer, old_hash=customer_hash, new_hash=new_hash)
     
     # Create and return JWT token
-    access_token = create_access_token(data={"sub": customer.mail, "role": "customer"})
+    access_token = create_access_token(data={"sub": customer.mail, "role": "customer", "uid": customer.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -226,26 +328,28 @@ class CustomerNameUpdate(BaseModel):
 @app.patch("/customer/me/update", response_model=CustomerRead, tags=["Customer Auth"])
 async def update_customer_name(
     update_data: CustomerNameUpdate,
-    current_customer: Customer = Depends(get_current_customer)
+    current_customer: Customer = Depends(get_current_customer),
+    session: AsyncSession = Depends(get_session)
 ):
-    with Session(engine) as session:
-        # Fetch from DB to ensure we have the latest object attached to session
-        customer_db = session.get(Customer, current_customer.id)
-        if not customer_db:
-            raise HTTPException(status_code=404, detail="Customer not found")
+    # Same object as current_customer (identity map of the request session). It may come from the
+    # principal cache, so it is re-read before being changed and returned.
+    customer_db = await session.get(Customer, current_customer.id)
+    if not customer_db:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    await session.refresh(customer_db)
         
-        # Update field
-        customer_db.name = update_data.name
+    # Update field
+    customer_db.name = update_data.name
         
-        session.add(customer_db)
-        session.commit()
-        session.refresh(customer_db)
-        return customer_db
+    session.add(customer_db)
+    await session.flush()
+    return customer_db
 
 @app.post("/customer/me/upload-pfp", tags=["Customer Auth"])
 async def upload_profile_picture(
     file: UploadFile = File(...),
-    current_customer: Customer = Depends(get_current_customer)
+    current_customer: Customer = Depends(get_current_customer),
+    session: AsyncSession = Depends(get_session)
 ):
     # 1. Define the location (Matches your Static Mount logic)
     # base_dir/../data/profile_pictures
@@ -266,30 +370,31 @@ async def upload_profile_picture(
     # The static mount is at /profile_pictures, so the URL is "profile_pictures/filename"
     relative_url = f"profile_pictures/{new_filename}"
     
-    with Session(engine) as session:
-        customer_db = session.get(Customer, current_customer.id)
+    customer_db = await session.get(Customer, current_customer.id)
+    await session.refresh(customer_db)      # May be the cached principal (see update_customer_name)
         
-        # FIX: Change 'image_url' to 'profile_pic'
-        customer_db.profile_pic = relative_url 
+    # FIX: Change 'image_url' to 'profile_pic'
+    customer_db.profile_pic = relative_url 
         
-        session.add(customer_db)
-        session.commit()
+    session.add(customer_db)
+    await session.flush()
         
     return {"image_url": relative_url}
 
 # --- UPDATED ENDPOINT: Get Cart (Auto-creates if missing) ---
 @app.get("/cart", response_model=CartRead, tags=["Cart & Checkout"])
 async def get_customer_cart(
-    customer: Customer = Depends(get_current_customer)
+    customer: Customer = Depends(get_current_customer),
+    session: AsyncSession = Depends(get_session)
 ):
     # Try to find existing cart
-    cart = await run_in_threadpool(get_cart_by_customer_id, customer_id=customer.id)
+    cart = await get_cart_by_customer_id(session, customer_id=customer.id)
     
     # FIX: If cart doesn't exist, create it now instead of returning 404
     if not cart:
-        cart = await run_in_threadpool(create_cart_for_customer, customer_id=customer.id)
+        cart = await create_cart_for_customer(session, customer_id=customer.id)
         
-    detailed_items = await run_in_threadpool(get_detailed_cart_items, cart_id=cart.id)
+    detailed_items = await get_detailed_cart_items(session, cart_id=cart.id)
     
     # Calculate total size safely
     total_size = sum(item['quantity'] for item in detailed_items)
@@ -306,29 +411,29 @@ async def get_customer_cart(
 # FIND AND REPLACE THE ENTIRE 'get_my_orders' FUNCTION WITH THIS:
 
 @app.get("/customer/orders", response_model=List[OrderRecordsRead], tags=["Cart & Checkout"])
-def get_my_orders(customer: Customer = Depends(get_current_customer)):
-    with Session(engine) as session:
-        orders_db = session.exec(select(OrderRecords).where(OrderRecords.customer_id == customer.id).order_by(OrderRecords.order_date.desc())).all()
+async def get_my_orders(customer: Customer = Depends(get_current_customer), session: AsyncSession = Depends(get_read_session)):
+    orders_db = (await session.exec(select(OrderRecords).where(OrderRecords.customer_id == customer.id).order_by(OrderRecords.order_date.desc()))).all()
         
-        final_results = []
-        for order in orders_db:
-            order_schema = OrderRecordsRead.model_validate(order)
-            items_with_product = session.exec(
-                select(OrderItem, Product.name)
-                .join(Product, Product.id == OrderItem.product_id)
-                .where(OrderItem.orderrecords_id == order.id)
-            ).all()
+    final_results = []
+    for order in orders_db:
+        order_schema = OrderRecordsRead.model_validate(order)
+        items_with_product = (await session.exec(
+            select(OrderItem, Product.name)
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.orderrecords_id == order.id)
+        )).all()
             
-            order_items_data = []
-            for item, p_name in items_with_product:
-                i_dict = item.model_dump()
-                i_dict['product_name'] = p_name
-                order_items_data.append(i_dict)
+        order_items_data = []
+        for item, p_name in items_with_product:
+            item_schema = OrderItemRead.model_validate(item)
+            item_schema.product_name = p_name
+            order_items_data.append(item_schema)
             
-            order_schema.items = order_items_data
-            final_results.append(order_schema)
+        order_schema.items = order_items_data
+        final_results.append(order_schema)
             
-        return final_results
+    # Already validated above: serialize straight to JSON instead of letting response_model validate it again
+    return schema_response(ORDER_LIST, final_results)
     
 # -------------------------------------------------------------------------------------------------------------------------------------------------
 # --- Retailer Auth Endpoints ---
@@ -337,17 +442,18 @@ def get_my_orders(customer: Customer = Depends(get_current_customer)):
 @app.post("/signup/retailer", response_model=RetailerRead, status_code=status.HTTP_201_CREATED, tags=["Retailer Auth"])
 async def signup_retailer(
     retailer: RetailerCreate,
-    background_tasks: BackgroundTasks # <--- NEW: Required for sending email
+    background_tasks: BackgroundTasks, # <--- NEW: Required for sending email
+    session: AsyncSession = Depends(get_session)
 ):
     
-    exists = await run_in_threadpool(get_retailer_by_email, retailer.mail)
+    exists = await get_retailer_by_email(session, retailer.mail)
     if exists:
         raise HTTPException(status_code=400, detail="Email Already Registered")
 
-    hashed_password = hash_password(retailer.password)
+    hashed_password = await hash_password_async(retailer.password)
     
-    new_retailer = await run_in_threadpool(
-        add_retailer,
+    new_retailer = await add_retailer(
+        session,
         name=retailer.name,
         mail=retailer.mail,
         hashed_password=hashed_password,
@@ -367,7 +473,7 @@ async def signup_retailer(
     
     # --- NEW: Send Verification OTP ---
     otp = generate_otp()
-    await run_in_threadpool(save_verification_otp, retailer.mail, otp)
+    await save_verification_otp(session, retailer.mail, otp)
     await send_verification_email(retailer.mail, otp, background_tasks)
     # ----------------------------------
     
@@ -375,10 +481,11 @@ async def signup_retailer(
 
 @app.post("/login/retailer", response_model=Token, tags=["Retailer Auth"])
 async def login_retailer(
-    req: LoginRequest
+    req: LoginRequest,
+    session: AsyncSession = Depends(get_session)
 ):
     
-    retailer = await run_in_threadpool(get_retailer_by_email, req.mail)
+    retailer = await get_retailer_by_email(session, req.mail)
     if not retailer:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Credentials")
 
@@ -387,11 +494,16 @@ async def login_retailer(
         raise HTTPException(status_code=403, detail="Account not verified. Please verify your email.")
     # ----------------------------------------
 
-    if not verify_password(req.password, retailer.hashed_password):
+    retailer_hash = retailer.hashed_password
+    valid, new_hash = await check_password_async(req.password, retailer_hash)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Credentials")
+    # Hashes in an older format are replaced while the plain password is at hand
+    if new_hash:
+        await upgrade_password_hash(session, retailer, old_hash=retailer_hash, new_hash=new_hash)
 
     # Create and return JWT token
-    access_token = create_access_token(data={"sub": retailer.mail, "role": "retailer"})
+    access_token = create_access_token(data={"sub": retailer.mail, "role": "retailer", "uid": retailer.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -407,17 +519,18 @@ async def get_me(retailer: Retailer = Depends(get_current_retailer)):
 @app.post("/signup/wholesaler", response_model=WholesalerRead, status_code=status.HTTP_201_CREATED, tags=["Wholesaler Auth"])
 async def signup_wholesaler(
     wholesaler: WholesalerCreate,
-    background_tasks: BackgroundTasks # <--- NEW: Required for sending email
+    background_tasks: BackgroundTasks, # <--- NEW: Required for sending email
+    session: AsyncSession = Depends(get_session)
 ):
     
-    exists = await run_in_threadpool(get_wholesaler_by_email, wholesaler.mail)
+    exists = await get_wholesaler_by_email(session, wholesaler.mail)
     if exists:
         raise HTTPException(status_code=400, detail="Email Already Registered")
 
-    hashed_password = hash_password(wholesaler.password)
+    hashed_password = await hash_password_async(wholesaler.password)
     
-    new_wholesaler = await run_in_threadpool(
-        add_wholesaler,
+    new_wholesaler = await add_wholesaler(
+        session,
         name=wholesaler.name,
         mail=wholesaler.mail,
         hashed_password=hashed_password,
@@ -437,7 +550,7 @@ async def signup_wholesaler(
     
     # --- NEW: Send Verification OTP ---
     otp = generate_otp()
-    await run_in_threadpool(save_verification_otp, wholesaler.mail, otp)
+    await save_verification_otp(session, wholesaler.mail, otp)
     await send_verification_email(wholesaler.mail, otp, background_tasks)
     # ----------------------------------
     
@@ -445,10 +558,11 @@ async def signup_wholesaler(
 
 @app.post("/login/wholesaler", response_model=Token, tags=["Wholesaler Auth"])
 async def login_wholesaler(
-    req: LoginRequest
+    req: LoginRequest,
+    session: AsyncSession = Depends(get_session)
 ):
     
-    wholesaler = await run_in_threadpool(get_wholesaler_by_email, req.mail)
+    wholesaler = await get_wholesaler_by_email(session, req.mail)
     if not wholesaler:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Credentials")
 
@@ -457,11 +571,16 @@ async def login_wholesaler(
         raise HTTPException(status_code=403, detail="Account not verified. Please verify your email.")
     # ----------------------------------------
 
-    if not verify_password(req.password, wholesaler.hashed_password):
+    wholesaler_hash = wholesaler.hashed_password
+    valid, new_hash = await check_password_async(req.password, wholesaler_hash)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Credentials")
+    # Hashes in an older format are replaced while the plain password is at hand
+    if new_hash:
+        await upgrade_password_hash(session, wholesaler, old_hash=wholesaler_hash, new_hash=new_hash)
 
     # Create and return JWT token
-    access_token = create_access_token(data={"sub": wholesaler.mail, "role": "wholesaler"})
+    access_token = create_access_token(data={"sub": wholesaler.mail, "role": "wholesaler", "uid": wholesaler.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -481,111 +600,105 @@ async def add_wholesale_product(
     stock: int = Form(...),
     min_qty: int = Form(10),
     image: UploadFile = File(None), # <--- Image Upload
-    current_wholesaler: Wholesaler = Depends(get_current_wholesaler)
+    current_wholesaler: Wholesaler = Depends(get_current_wholesaler),
+    session: AsyncSession = Depends(get_session)
 ):
     # 1. Create DB Object
-    with Session(engine) as session:
-        new_item = WholesalerProduct(
-            wholesaler_id=current_wholesaler.id,
-            name=name,
-            price=price,
-            stock=stock,
-            min_qty=min_qty,
-            image_url="product_images/default.png" # Default
-        )
-        session.add(new_item)
-        session.commit()
-        session.refresh(new_item)
-
-        # 2. Handle Image File
-        if image:
-            try:
-                file_ext = image.filename.split(".")[-1]
-                # Unique Name: ws_{id}_{uuid}.ext
-                file_name = f"ws_{new_item.id}_{uuid.uuid4()}.{file_ext}"
-                file_path = os.path.join(product_images_dir, file_name)
+    new_item = WholesalerProduct(
+        wholesaler_id=current_wholesaler.id,
+        name=name,
+        price=price,
+        stock=stock,
+        min_qty=min_qty,
+        image_url="product_images/default.png" # Default
+    )
+    session.add(new_item)
+    await session.flush()
+
+    # 2. Handle Image File
+    if image:
+        try:
+            file_ext = image.filename.split(".")[-1]
+            # Unique Name: ws_{id}_{uuid}.ext
+            file_name = f"ws_{new_item.id}_{uuid.uuid4()}.{file_ext}"
+            file_path = os.path.join(product_images_dir, file_name)
                 
-                with open(file_path, "wb") as buffer:
-                    shutil.copyfileobj(image.file, buffer)
+            with open(file_path, "wb") as buffer:
+                shutil.copyfileobj(image.file, buffer)
                 
-                # Update URL in DB
-                new_item.image_url = f"product_images/{file_name}"
-                session.add(new_item)
-                session.commit()
-                session.refresh(new_item)
-            except Exception as e:
-                print(f"Image upload failed: {e}")
+            # Update URL in DB
+            new_item.image_url = f"product_images/{file_name}"
+            session.add(new_item)
+            await session.flush()
+        except Exception as e:
+            print(f"Image upload failed: {e}")
 
-        return new_item
+    return new_item
 
 @app.get("/wholesaler/my-products", response_model=List[WholesalerProduct], tags=["Wholesaler Workflow"])
-def get_my_wholesale_inventory(current_wholesaler: Wholesaler = Depends(get_current_wholesaler)):
-    with Session(engine) as session:
-        statement = select(WholesalerProduct).where(WholesalerProduct.wholesaler_id == current_wholesaler.id)
-        return session.exec(statement).all()
+async def get_my_wholesale_inventory(current_wholesaler: Wholesaler = Depends(get_current_wholesaler), session: AsyncSession = Depends(get_session)):
+    statement = select(WholesalerProduct).where(WholesalerProduct.wholesaler_id == current_wholesaler.id)
+    return (await session.exec(statement)).all()
 
 @app.put("/wholesaler/products/{item_id}", response_model=WholesalerProduct, tags=["Wholesaler Workflow"])
-def update_wholesale_product(
+async def update_wholesale_product(
     item_id: int,
     update_data: WholesalerProductUpdate,
-    current_wholesaler: Wholesaler = Depends(get_current_wholesaler)
+    current_wholesaler: Wholesaler = Depends(get_current_wholesaler),
+    session: AsyncSession = Depends(get_session)
 ):
-    with Session(engine) as session:
-        item = session.get(WholesalerProduct, item_id)
-        if not item or item.wholesaler_id != current_wholesaler.id:
-            raise HTTPException(status_code=404, detail="Item not found")
+    item = await session.get(WholesalerProduct, item_id)
+    if not item or item.wholesaler_id != current_wholesaler.id:
+        raise HTTPException(status_code=404, detail="Item not found")
         
-        if update_data.price is not None: item.price = update_data.price
-        if update_data.stock is not None: item.stock = update_data.stock
-        if update_data.min_qty is not None: item.min_qty = update_data.min_qty
+    if update_data.price is not None: item.price = update_data.price
+    if update_data.stock is not None: item.stock = update_data.stock
+    if update_data.min_qty is not None: item.min_qty = update_data.min_qty
         
-        session.add(item)
-        session.commit()
-        session.refresh(item)
-        return item
+    session.add(item)
+    await session.flush()
+    return item
     
 
 
 @app.get("/wholesaler/orders", response_model=List[WholesaleOrderRead], tags=["Wholesaler Workflow"])
-def get_wholesale_orders(current_wholesaler: Wholesaler = Depends(get_current_wholesaler)):
-    with Session(engine) as session:
-        # Fetch pending/processing orders
-        statement = select(WholesaleOrder).where(
-            (WholesaleOrder.wholesaler_id == current_wholesaler.id) &
-            (WholesaleOrder.status.in_(["Pending", "Processing"]))
-        ).order_by(WholesaleOrder.order_date.desc())
+async def get_wholesale_orders(current_wholesaler: Wholesaler = Depends(get_current_wholesaler), session: AsyncSession = Depends(get_session)):
+    # Fetch pending/processing orders
+    statement = select(WholesaleOrder).where(
+        (WholesaleOrder.wholesaler_id == current_wholesaler.id) &
+        (WholesaleOrder.status.in_(["Pending", "Processing"]))
+    ).order_by(WholesaleOrder.order_date.desc())
         
-        orders = session.exec(statement).all()
-        return _build_order_response(session, orders)
+    orders = (await session.exec(statement)).all()
+    return await _build_order_response(session, orders)
 
 
 @app.get("/wholesaler/history", response_model=List[WholesaleOrderRead], tags=["Wholesaler Workflow"])
-def get_wholesale_history(current_wholesaler: Wholesaler = Depends(get_current_wholesaler)):
-    with Session(engine) as session:
-        # Fetch completed orders
-        statement = select(WholesaleOrder).where(
-            (WholesaleOrder.wholesaler_id == current_wholesaler.id) &
-            (WholesaleOrder.status.in_(["Shipped", "Delivered", "Approved"]))
-        ).order_by(WholesaleOrder.order_date.desc())
+async def get_wholesale_history(current_wholesaler: Wholesaler = Depends(get_current_wholesaler), session: AsyncSession = Depends(get_session)):
+    # Fetch completed orders
+    statement = select(WholesaleOrder).where(
+        (WholesaleOrder.wholesaler_id == current_wholesaler.id) &
+        (WholesaleOrder.status.in_(["Shipped", "Delivered", "Approved"]))
+    ).order_by(WholesaleOrder.order_date.desc())
         
-        orders = session.exec(statement).all()
-        return _build_order_response(session, orders)
+    orders = (await session.exec(statement)).all()
+    return await _build_order_response(session, orders)
 
 # --- HELPER FUNCTION TO POPULATE DETAILS ---
-def _build_order_response(session, orders):
+async def _build_order_response(session, orders):
     results = []
     for o in orders:
         # 1. Get Retailer Name
-        retailer = session.get(Retailer, o.retailer_id)
+        retailer = await session.get(Retailer, o.retailer_id)
         r_name = retailer.business_name if retailer else f"Retailer #{o.retailer_id}"
         
         # 2. Get Items & Product Names
         # We join WholesaleOrderItem with WholesalerProduct to get the name
-        items = session.exec(
+        items = (await session.exec(
             select(WholesaleOrderItem, WholesalerProduct.name)
             .join(WholesalerProduct, WholesalerProduct.id == WholesaleOrderItem.product_id)
             .where(WholesaleOrderItem.wholesale_order_id == o.id)
-        ).all()
+        )).all()
         
         item_list = []
         for w_item, p_name in items:
@@ -612,7 +725,7 @@ def _build_order_response(session, orders):
 # -------------------------------------------------------------------------------------------------------------------------------------------------
 
 @app.post("/auth/verify-account", status_code=status.HTTP_200_OK, tags=["Auth"])
-async def verify_account_endpoint(req: AccountVerificationRequest):
+async def verify_account_endpoint(req: AccountVerificationRequest, session: AsyncSession = Depends(get_session)):
     
     # 1. Convert to Dict (Safest way to read data)
     try:
@@ -625,7 +738,7 @@ async def verify_account_endpoint(req: AccountVerificationRequest):
     role = data.get("role") # Safely get role (returns None if missing)
 
     # 2. Verify OTP
-    success = await run_in_threadpool(verify_user_account, email, otp)
+    success = await verify_user_account(session, email, otp)
     if not success:
         raise HTTPException(status_code=400, detail="Invalid or Expired OTP")
 
@@ -634,9 +747,8 @@ async def verify_account_endpoint(req: AccountVerificationRequest):
     
     # Fallback: If frontend didn't send role, check DB
     if not final_role:
-        if await run_in_threadpool(get_customer_by_email, email): final_role = "customer"
-        elif await run_in_threadpool(get_retailer_by_email, email): final_role = "retailer"
-        elif await run_in_threadpool(get_wholesaler_by_email, email): final_role = "wholesaler"
+        identities = await get_identities_by_email(session, email)
+        if identities: final_role = identities[0][0]
 
     if not final_role:
         raise HTTPException(status_code=404, detail="User verified but role not found.")
@@ -653,21 +765,19 @@ async def verify_account_endpoint(req: AccountVerificationRequest):
 
 
 @app.post("/auth/resend-verification", tags=["Auth"])
-async def resend_verification(email: str, background_tasks: BackgroundTasks):
+async def resend_verification(email: str, background_tasks: BackgroundTasks, session: AsyncSession = Depends(get_session)):
     # Check if user exists
-    customer = await run_in_threadpool(get_customer_by_email, email)
-    retailer = await run_in_threadpool(get_retailer_by_email, email)
-    wholesaler = await run_in_threadpool(get_wholesaler_by_email, email)
-    
-    user = customer or retailer or wholesaler
-    if not user:
+    accounts = await get_accounts_by_email(session, email)
+    if not accounts:
         raise HTTPException(status_code=404, detail="User not found")
+
+    user = accounts[0][1]
     
     if user.is_verified:
         return {"message": "Account already verified"}
         
     otp = generate_otp()
-    await run_in_threadpool(save_verification_otp, email, otp)
+    await save_verification_otp(session, email, otp)
     await send_verification_email(email, otp, background_tasks)
     
     return {"message": "Verification OTP Resent."}
@@ -688,7 +798,7 @@ async def login_google(request: Request):
 # FIND AND REPLACE THE ENTIRE 'auth_google' FUNCTION WITH THIS:
 
 @app.get("/auth/google", tags=["Social Auth"])
-async def auth_google(request: Request):
+async def auth_google(request: Request, session: AsyncSession = Depends(get_session)):
     try:
         token = await oauth.google.authorize_access_token(request)
         user_info = token.get('userinfo') or await oauth.google.userinfo(token=token)
@@ -698,34 +808,33 @@ async def auth_google(request: Request):
         role = "customer"
         redirect_page = "Customer.html"
         
+        # Every account registered with this email, by role
+        accounts = dict(await get_accounts_by_email(session, email))
+
         # Check Retailer
-        retailer = await run_in_threadpool(get_retailer_by_email, email)
+        retailer = accounts.get("retailer")
         if retailer:
             role = "retailer"
             redirect_page = "Retailer.html"
             if not retailer.is_verified:
-                with Session(engine) as s:
-                    r = s.get(Retailer, retailer.id)
-                    r.is_verified = True
-                    s.add(r); s.commit()
+                retailer.is_verified = True
+                session.add(retailer)
         
         # Check Wholesaler
-        elif await run_in_threadpool(get_wholesaler_by_email, email):
+        elif "wholesaler" in accounts:
             role = "wholesaler"
             redirect_page = "Wholesaler.html"
         
         # Default to Customer
         else:
-            customer = await run_in_threadpool(get_customer_by_email, mail=email)
+            customer = accounts.get("customer")
             if not customer:
-                random_pass = hash_password(email + datetime.utcnow().isoformat())
-                customer = await run_in_threadpool(add_customer, name=name, mail=email, hashed_password=random_pass)
+                random_pass = await hash_password_async(email + datetime.utcnow().isoformat())
+                customer = await add_customer(session, name=name, mail=email, hashed_password=random_pass)
             
             if not customer.is_verified:
-                 with Session(engine) as s:
-                    c = s.get(Customer, customer.id)
-                    c.is_verified = True
-                    s.add(c); s.commit()
+                 customer.is_verified = True
+                 session.add(customer)
         
         access_token = create_access_token(data={"sub": email, "role": role})
         return RedirectResponse(url=f"/{redirect_page}?token={access_token}")
@@ -740,73 +849,194 @@ async def auth_google(request: Request):
 
 # 1. GET ALL PRODUCTS
 # Matches requests to "/products" (e.g., from dashboard.html)
+# Products per /products page (?limit=), and the most a client may ask for
+PRODUCT_PAGE_SIZE = 50
+MAX_PRODUCT_PAGE_SIZE = 200
+
+PRODUCT_LIST = TypeAdapter(List[ProductRead])
+
 @app.get("/products", response_model=List[ProductRead], tags=["Products"])
-def get_all_products(
+async def get_all_products(
+    request: Request,
     q: Optional[str] = None,
     category: Optional[str] = None, 
     min_price: Optional[float] = None, 
     max_price: Optional[float] = None,
-    sort_by: Optional[str] = "newest"
+    sort_by: Optional[str] = None,     # relevance (default with q) | newest (default) | price_low | price_high | rating
+    min_rating: Optional[float] = Query(default=None, ge=0, le=5),
+    limit: int = Query(default=PRODUCT_PAGE_SIZE, ge=1, le=MAX_PRODUCT_PAGE_SIZE),
+    cursor: Optional[str] = None,      # X-Next-Cursor from the previous page
+    session: AsyncSession = Depends(get_read_session)
 ):
-    with Session(engine) as session:
-        query = select(Product)
-        
-        # --- FIX: HARDCODED CATEGORY MAPPING ---
-        # Matches the IDs used in retailer-add-product.html
-        cat_map = {
-            "electronics": 1,
-            "groceries": 2,
-            "fashion": 3,
-            "books": 5,
-            "sports": 8, # Matches 'Sports' in your HTML
-            "home": 7    # Matches 'Home' in your HTML
-            # Add others if needed
-        }
-
-        # Search Logic
-        if q:
-            search_term = f"%{q}%"
-            query = query.where(
-                or_(
-                    col(Product.name).ilike(search_term),
-                    col(Product.description).ilike(search_term)
-                )
-            )
-            
-        # Category Logic
-        if category and category.lower() != "all":
-            if category.isdigit():
-                query = query.where(Product.category_id == int(category))
-            else:
-                # Check our manual map instead of the empty DB table
-                cat_id = cat_map.get(category.lower())
-                if cat_id:
-                    query = query.where(Product.category_id == cat_id)
-            
-        # Filtering & Sorting
-        if min_price is not None:
-            query = query.where(Product.price >= min_price)
-        if max_price is not None:
-            query = query.where(Product.price <= max_price)
-            
-        if sort_by == "price_low":
-            query = query.order_by(Product.price.asc())
-        elif sort_by == "price_high":
-            query = query.order_by(Product.price.desc())
-        else:
-            query = query.order_by(Product.id.desc())
-            
-        return session.exec(query).all()
+    # Nothing in the catalog changed since the client's copy: 304 without running the listing query
+    headers = version_headers(await get_data_versions(session, "category", "product"))
+    if is_not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    query = select(Product)
+
+    # Category Logic: id or name, looked up in the category registry (unknown names list every category)
+    if category_registry.claim_refresh():
+        await session.run_sync(category_registry.load)
+    category_id = None
+    if category and category.lower() != "all":
+        category_id = category_registry.resolve(category)
+
+    q = q.strip().lower() if q else None
+    if not sort_by:
+        sort_by = "relevance" if q else "newest"
+    # One page at a time; the next page's cursor goes in the X-Next-Cursor header
+    if sort_by not in PRODUCT_PAGE_ORDER and not (sort_by == "relevance" and q):
+        sort_by = "newest"
+
+    # Serve the same normalized query from the listing cache (dropped when a product in the category changes).
+    # The data version is part of the key, so a write through another worker (which cannot drop this
+    # worker's entries) makes them miss instead of serving stale rows under the new ETag.
+    cache_key = (headers["ETag"], q, category_id, min_price, max_price, min_rating, sort_by, limit, cursor)
+    cached = product_listing_cache.get(cache_key)
+    if cached is None:
+        generation = product_listing_cache.generation
+
+        # Search (full-text index, best matches first unless another sort is asked for), Filtering & Sorting
+        query = filter_products(query, q, min_price, max_price, rank_results=(sort_by == "relevance"), min_rating=min_rating)
+        if category_id:
+            query = query.where(Product.category_id == category_id)
+        query, offset = apply_product_page(query, sort_by, cursor)
+
+        # One extra row tells whether another page exists
+        products = (await session.exec(query.limit(limit + 1))).all()
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            next_cursor = next_product_cursor(sort_by, products[-1], offset, limit)
+
+        # Cached already serialized, so a hit skips validation and JSON encoding too
+        body = PRODUCT_LIST.dump_json(PRODUCT_LIST.validate_python(products, from_attributes=True))
+        cached = (body, next_cursor)
+        product_listing_cache.put(cache_key, category_id, cached, generation)
+
+    body, next_cursor = cached
+    if next_cursor:
+        headers = {**headers, "X-Next-Cursor": next_cursor}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Filter counts for the same q / category / price range as /products: per category, per price bucket
+# and in stock vs out of stock, so the filter sidebar can show them without fetching the listing
+@app.get("/products/facets", response_model=ProductFacets, tags=["Products"])
+async def get_product_facets_endpoint(
+    request: Request,
+    response: Response,
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[float] = Query(default=None, ge=0, le=5),
+    session: AsyncSession = Depends(get_read_session)
+):
+    headers = version_headers(await get_data_versions(session, "category", "product"))
+    if is_not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if category_registry.claim_refresh():
+        await session.run_sync(category_registry.load)
+    category_id = None
+    if category and category.lower() != "all":
+        category_id = category_registry.resolve(category)
+    q = q.strip().lower() if q else None
+
+    # Cached next to the listings, keyed on the data version the same way. The category counts span
+    # every category, so any product write drops it.
+    cache_key = ("facets", headers["ETag"], q, category_id, min_price, max_price, min_rating)
+    facets = product_listing_cache.get(cache_key)
+    if facets is None:
+        generation = product_listing_cache.generation
+        facets = await get_product_facets(session, q, category_id, min_price, max_price, min_rating)
+        product_listing_cache.put(cache_key, None, facets, generation)
+
+    categories = [
+        {"id": cat_id, "name": (category_registry.get(cat_id) or {}).get("name"), "count": count}
+        for cat_id, count in facets["categories"].items()
+    ]
+    categories.sort(key=lambda facet: -facet["count"])
+    response.headers.update(headers)
+    return {**facets, "categories": categories}
+
+# Search box autocomplete, answered from memory: categories, words from product names (brands, product
+# types) and the most ordered products matching what has been typed so far
+@app.get("/products/suggest", response_model=ProductSuggestions, tags=["Products"])
+async def suggest_products(
+    background_tasks: BackgroundTasks,
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(default=8, ge=1, le=20)
+):
+    if product_suggest_index.claim_refresh():
+        background_tasks.add_task(reload_index, product_suggest_index)
+
+    terms, products = product_suggest_index.suggest(prefix, limit)
+    words = WORD.findall(prefix.lower())
+    categories = category_registry.suggest(words[-1], limit) if len(words) == 1 else []
+    return {
+        "categories": [{"id": category["id"], "name": category["name"]} for category in categories],
+        "terms": terms,
+        "products": [{"id": product_id, "name": name} for product_id, name in products],
+    }
+
+# Every category with its product / in-stock counts, served from the category registry
+@app.get("/categories", response_model=List[CategoryReadWithCounts], tags=["Products"])
+async def get_categories(session: AsyncSession = Depends(get_read_session)):
+    if category_registry.claim_refresh():
+        await session.run_sync(category_registry.load)
+    return category_registry.all()
+
+# Many products in one request, e.g. ?ids=3,17,42 for a cart, an order or a recommendation strip.
+# Returned in the order asked for; ids that do not exist are left out.
+@app.get("/products/batch", response_model=List[ProductRead], tags=["Products"])
+async def get_products_batch(ids: str, request: Request, session: AsyncSession = Depends(get_read_session)):
+    try:
+        product_ids = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of product ids")
+    if len(product_ids) > MAX_PRODUCT_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PRODUCT_PAGE_SIZE} ids per request")
+
+    headers = version_headers(await get_data_versions(session, "product"))
+    if is_not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    products = await get_products_by_ids(session, product_ids)
+    found = [products[product_id] for product_id in dict.fromkeys(product_ids) if product_id in products]
+    return schema_response(PRODUCT_LIST, PRODUCT_LIST.validate_python(found, from_attributes=True), headers)
 
 # 2. GET SINGLE PRODUCT
 # Matches requests to "/products/100" (e.g., from product-details.html)
 @app.get("/products/{product_id}", response_model=ProductRead, tags=["Products"])
-async def get_product_detail(product_id: int):
-    with Session(engine) as session:
-        product = session.get(Product, product_id)
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        return product
+async def get_product_detail(product_id: int, request: Request, response: Response, session: AsyncSession = Depends(get_read_session)):
+    headers = version_headers(await get_data_versions(session, "product"))
+    if is_not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    product = await session.get(Product, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    response.headers.update(headers)
+    return product
+
+# "Frequently bought together": the products most often in the same order, precomputed by build_related.py
+@app.get("/products/{product_id}/related", response_model=List[ProductRead], tags=["Products"])
+async def get_related_products_endpoint(
+    product_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(default=RELATED_PRODUCTS_TOP_K, ge=1, le=RELATED_PRODUCTS_TOP_K),
+    session: AsyncSession = Depends(get_read_session)
+):
+    headers = version_headers(await get_data_versions(session, "product", "product_relation"))
+    if is_not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    products = await get_related_products(session, product_id, limit)
+    response.headers.update(headers)
+    return products
 
 # 3. ADD PRODUCT
 @app.post("/products/add/", response_model=ProductRead, status_code=status.HTTP_201_CREATED, tags=["Products"])
@@ -817,12 +1047,16 @@ async def create_product_endpoint(
     description: str = Form(None),
     category_id: int = Form(...),
     image: UploadFile = File(None), # Optional file upload
-    current_retailer: Retailer = Depends(get_current_retailer)
+    current_retailer: Retailer = Depends(get_current_retailer),
+    session: AsyncSession = Depends(get_session)
 ):
+    if not category_registry.get(category_id):
+        raise HTTPException(status_code=400, detail="Unknown category")
+
     # 1. Create the product in DB first (to get the ID)
     # We set a temporary image_url
-    new_product = await run_in_threadpool(
-        add_product,
+    new_product = await add_product(
+        session,
         name, price, stock, current_retailer.id,
         description, category_id, "" 
     )
@@ -848,13 +1082,11 @@ async def create_product_endpoint(
             
             # We need a small helper to update just the image_url
             # For now, we can re-use update_product_details or do it manually here
-            with Session(engine) as session:
-                p = session.get(Product, new_product.id)
-                p.image_url = relative_path
-                session.add(p)
-                session.commit()
-                session.refresh(p)
-                new_product = p # Update return object
+            p = await session.get(Product, new_product.id)
+            p.image_url = relative_path
+            session.add(p)
+            await session.flush()
+            new_product = p # Update return object
                 
         except Exception as e:
             print(f"Error saving image: {e}")
@@ -862,13 +1094,11 @@ async def create_product_endpoint(
             pass
     else:
         # Set default if no image uploaded
-        with Session(engine) as session:
-            p = session.get(Product, new_product.id)
-            p.image_url = "product_images/default.png"
-            session.add(p)
-            session.commit()
-            session.refresh(p)
-            new_product = p
+        p = await session.get(Product, new_product.id)
+        p.image_url = "product_images/default.png"
+        session.add(p)
+        await session.flush()
+        new_product = p
 
     return new_product
 
@@ -877,121 +1107,118 @@ async def create_product_endpoint(
 @app.delete("/retailer/products/{product_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Retailer Workflow"])
 async def delete_product(
     product_id: int,
-    current_retailer: Retailer = Depends(get_current_retailer)
+    current_retailer: Retailer = Depends(get_current_retailer),
+    session: AsyncSession = Depends(get_session)
 ):
-    with Session(engine) as session:
-        product = session.get(Product, product_id)
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        if product.retailer_id != current_retailer.id:
-            raise HTTPException(status_code=403, detail="Not authorized to delete this product")
+    product = await session.get(Product, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    if product.retailer_id != current_retailer.id:
+        raise HTTPException(status_code=403, detail="Not authorized to delete this product")
         
-        session.delete(product)
-        session.commit()
-        return None
+    await session.delete(product)
+    await session.flush()
+    return None
 
 # 2. GET CUSTOMER PURCHASE HISTORY (For this retailer)
 @app.get("/retailer/customer-history", tags=["Retailer Workflow"])
-async def get_customer_history(current_retailer: Retailer = Depends(get_current_retailer)):
-    with Session(engine) as session:
-        # Get all orders containing this retailer's products
-        # We join OrderItem -> Product -> OrderRecords -> Customer
-        statement = select(OrderRecords, Customer, Product, OrderItem)\
-            .join(OrderItem, OrderItem.orderrecords_id == OrderRecords.id)\
-            .join(Product, Product.id == OrderItem.product_id)\
-            .join(Customer, Customer.id == OrderRecords.customer_id)\
-            .where(Product.retailer_id == current_retailer.id)\
-            .order_by(OrderRecords.order_date.desc())
+async def get_customer_history(current_retailer: Retailer = Depends(get_current_retailer), session: AsyncSession = Depends(get_session)):
+    # Get all orders containing this retailer's products
+    # We join OrderItem -> Product -> OrderRecords -> Customer
+    statement = select(OrderRecords, Customer, Product, OrderItem)\
+        .join(OrderItem, OrderItem.orderrecords_id == OrderRecords.id)\
+        .join(Product, Product.id == OrderItem.product_id)\
+        .join(Customer, Customer.id == OrderRecords.customer_id)\
+        .where(Product.retailer_id == current_retailer.id)\
+        .order_by(OrderRecords.order_date.desc())
             
-        results = session.exec(statement).all()
+    results = (await session.exec(statement)).all()
         
-        # Format data for frontend
-        history = []
-        for order, customer, product, item in results:
-            history.append({
-                "order_id": order.id,
-                "date": order.order_date,
-                "customer_name": customer.name,
-                "customer_email": customer.mail,
-                "product_name": product.name,
-                "quantity": item.quantity,
-                "total_paid": item.price_at_purchase * item.quantity
-            })
-        return history
+    # Format data for frontend
+    history = []
+    for order, customer, product, item in results:
+        history.append({
+            "order_id": order.id,
+            "date": order.order_date,
+            "customer_name": customer.name,
+            "customer_email": customer.mail,
+            "product_name": product.name,
+            "quantity": item.quantity,
+            "total_paid": item.price_at_purchase * item.quantity
+        })
+    return history
 
 # 3. B2B: GET WHOLESALE PRODUCTS (Mock logic: Wholesaler items are just products with a flag or separate table)
 # For simplicity, we'll return a mock list or query a specific "Wholesale" category if you have one.
 # Let's assume we create a fake list for now to demonstrate the UI.
 @app.get("/retailer/wholesale-market", tags=["Retailer Workflow"])
-def get_wholesale_market(current_retailer: Retailer = Depends(get_current_retailer)):
-    with Session(engine) as session:
-        # Fetch REAL data from WholesalerProduct table
-        results = session.exec(
-            select(WholesalerProduct, Wholesaler.business_name)
-            .join(Wholesaler, Wholesaler.id == WholesalerProduct.wholesaler_id)
-            .where(WholesalerProduct.stock > 0)
-        ).all()
+async def get_wholesale_market(current_retailer: Retailer = Depends(get_current_retailer), session: AsyncSession = Depends(get_read_session)):
+    # Fetch REAL data from WholesalerProduct table
+    results = (await session.exec(
+        select(WholesalerProduct, Wholesaler.business_name)
+        .join(Wholesaler, Wholesaler.id == WholesalerProduct.wholesaler_id)
+        .where(WholesalerProduct.stock > 0)
+    )).all()
         
-        market_items = []
-        for item, supplier_name in results:
-            market_items.append({
-                "id": item.id,
-                "name": item.name,
-                "price": item.price,
-                "min_qty": item.min_qty,
-                "stock": item.stock,
-                "supplier": supplier_name,
-                "image_url": item.image_url
-            })
-        return market_items
+    market_items = []
+    for item, supplier_name in results:
+        market_items.append({
+            "id": item.id,
+            "name": item.name,
+            "price": item.price,
+            "min_qty": item.min_qty,
+            "stock": item.stock,
+            "supplier": supplier_name,
+            "image_url": item.image_url
+        })
+    return market_items
     
 
 
 # 4. B2B: PLACE WHOLESALE ORDER
 @app.post("/retailer/wholesale-order", tags=["Retailer Workflow"])
-def place_wholesale_order(
+async def place_wholesale_order(
     item_id: int, 
     quantity: int, 
-    current_retailer: Retailer = Depends(get_current_retailer)
+    current_retailer: Retailer = Depends(get_current_retailer),
+    session: AsyncSession = Depends(get_session)
 ):
-    with Session(engine) as session:
-        # 1. Get Wholesaler Product
-        ws_product = session.get(WholesalerProduct, item_id)
-        if not ws_product:
-            raise HTTPException(status_code=404, detail="Item not found")
+    # 1. Get Wholesaler Product
+    ws_product = await session.get(WholesalerProduct, item_id)
+    if not ws_product:
+        raise HTTPException(status_code=404, detail="Item not found")
             
-        # 2. Validate Stock
-        if ws_product.stock < quantity:
-            raise HTTPException(status_code=400, detail=f"Insufficient stock. Available: {ws_product.stock}")
-
-        # 3. DEDUCT STOCK (The Fix)
-        ws_product.stock -= quantity
-        session.add(ws_product)
-
-        # 4. Create Order Record
-        total_cost = ws_product.price * quantity
-        new_order = WholesaleOrder(
-            retailer_id=current_retailer.id,
-            wholesaler_id=ws_product.wholesaler_id,
-            status="Pending",
-            total_price=total_cost,
-            delivery_address=current_retailer.address
-        )
-        session.add(new_order)
-        session.commit()
-        session.refresh(new_order)
+    # 2. Validate Stock
+    if ws_product.stock < quantity:
+        raise HTTPException(status_code=400, detail=f"Insufficient stock. Available: {ws_product.stock}")
+
+    # 3. DEDUCT STOCK (The Fix)
+    ws_product.stock -= quantity
+    session.add(ws_product)
+
+    # 4. Create Order Record
+    total_cost = ws_product.price * quantity
+    new_order = WholesaleOrder(
+        retailer_id=current_retailer.id,
+        wholesaler_id=ws_product.wholesaler_id,
+        status="Pending",
+        total_price=total_cost,
+        delivery_address=current_retailer.address
+    )
+    session.add(new_order)
+    await session.flush()
         
-        # 5. Link Order Item
-        order_item = WholesaleOrderItem(
-            wholesale_order_id=new_order.id,
-            product_id=ws_product.id, # Linking to WholesalerProduct ID
-            quantity=quantity,
-            price_per_unit=ws_product.price
-        )
-        session.add(order_item)
-        session.commit()
+    # 5. Link Order Item
+    order_item = WholesaleOrderItem(
+        wholesale_order_id=new_order.id,
+        product_id=ws_product.id, # Linking to WholesalerProduct ID
+        quantity=quantity,
+        price_per_unit=ws_product.price
+    )
+    session.add(order_item)
+    await session.flush()
         
-        return {"message": "Order placed successfully! Stock reserved."}
+    return {"message": "Order placed successfully! Stock reserved."}
 
 
 # -------------------------------------------------------------------------------------------------------------------------------------------------
@@ -1002,16 +1229,17 @@ def place_wholesale_order(
 @app.post("/cart/add", response_model=Optional[ShoppingCartItemRead], tags=["Cart & Checkout"])
 async def add_to_cart(
     item: ShoppingCartItemCreate, 
-    customer: Customer = Depends(get_current_customer) # This endpoint is now secured
+    customer: Customer = Depends(get_current_customer), # This endpoint is now secured
+    session: AsyncSession = Depends(get_session)
 ):
     
-    cart = await run_in_threadpool(get_cart_by_customer_id, customer_id=customer.id)
+    cart = await get_cart_by_customer_id(session, customer_id=customer.id)
     if not cart:
         raise HTTPException(status_code=404, detail="Customer cart not found")
     
     try:
-        new_item = await run_in_threadpool(
-            add_item_to_cart,
+        new_item = await add_item_to_cart(
+            session,
             product_id=item.product_id,
             quantity=item.quantity,
             cart_id=cart.id
@@ -1025,14 +1253,15 @@ async def add_to_cart(
 
 @app.get("/cart", response_model=CartRead, tags=["Cart & Checkout"])
 async def get_customer_cart(
-    customer: Customer = Depends(get_current_customer) # This endpoint is now secured
+    customer: Customer = Depends(get_current_customer), # This endpoint is now secured
+    session: AsyncSession = Depends(get_session)
 ):
     
-    cart = await run_in_threadpool(get_cart_by_customer_id, customer_id=customer.id)
+    cart = await get_cart_by_customer_id(session, customer_id=customer.id)
     if not cart:
         raise HTTPException(status_code=404, detail="Customer cart not found")
         
-    detailed_items = await run_in_threadpool(get_detailed_cart_items, cart_id=cart.id)
+    detailed_items = await get_detailed_cart_items(session, cart_id=cart.id)
     
     total_size = sum(item['quantity'] for item in detailed_items)
     
@@ -1043,7 +1272,8 @@ async def get_customer_cart(
 async def checkout(
     order_details: OrderCreate, 
     background_tasks: BackgroundTasks, # <--- Added BackgroundTasks
-    customer: Customer = Depends(get_current_customer)
+    customer: Customer = Depends(get_current_customer),
+    session: AsyncSession = Depends(get_session)
 ):
     # 1. Validations
     if not order_details.shipping_address or not order_details.shipping_city or not order_details.shipping_pincode:
@@ -1051,8 +1281,8 @@ async def checkout(
         
     try:
         # 2. Process Checkout (Database Transaction)
-        new_order = await run_in_threadpool(
-            process_checkout,
+        new_order = await process_checkout(
+            session,
             customer=customer,
             order_details=order_details
         )
@@ -1063,34 +1293,33 @@ async def checkout(
         # 3. --- NEW: PREPARE EMAIL DATA ---
         # We need to fetch the item names because 'process_checkout' consumes the cart
         # and OrderRecords usually just has IDs.
-        with Session(engine) as session:
-            # Join OrderItem with Product to get the names
-            items_db = session.exec(
-                select(OrderItem, Product.name)
-                .join(Product, Product.id == OrderItem.product_id)
-                .where(OrderItem.orderrecords_id == new_order.id)
-            ).all()
+        # Join OrderItem with Product to get the names
+        items_db = (await session.exec(
+            select(OrderItem, Product.name)
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.orderrecords_id == new_order.id)
+        )).all()
             
-            email_items = []
-            for item, p_name in items_db:
-                email_items.append({
-                    "name": p_name,
-                    "qty": item.quantity,
-                    "price": item.price_at_purchase
-                })
+        email_items = []
+        for item, p_name in items_db:
+            email_items.append({
+                "name": p_name,
+                "qty": item.quantity,
+                "price": item.price_at_purchase
+            })
             
-            full_address = f"{new_order.shipping_address}, {new_order.shipping_city}, {new_order.shipping_pincode}"
+        full_address = f"{new_order.shipping_address}, {new_order.shipping_city}, {new_order.shipping_pincode}"
             
-            # 4. Send Email in Background
-            await send_order_confirmation_email(
-                email=customer.mail,
-                name=customer.name,
-                order_id=new_order.id,
-                total_price=new_order.total_price,
-                items=email_items,
-                address=full_address,
-                background_tasks=background_tasks
-            )
+        # 4. Send Email in Background
+        await send_order_confirmation_email(
+            email=customer.mail,
+            name=customer.name,
+            order_id=new_order.id,
+            total_price=new_order.total_price,
+            items=email_items,
+            address=full_address,
+            background_tasks=background_tasks
+        )
 
         return new_order
         
@@ -1106,54 +1335,75 @@ async def checkout(
 # -------------------------------------------------------------------------------------------------------------------------------------------------
 
 @app.get("/retailer/my-products", response_model=List[ProductRead], tags=["Retailer Workflow"])
-async def get_my_products(current_retailer: Retailer = Depends(get_current_retailer)):
+async def get_my_products(current_retailer: Retailer = Depends(get_current_retailer), session: AsyncSession = Depends(get_session)):
     
-    products = await run_in_threadpool(get_products_by_retailer, retailer_id=current_retailer.id)
+    products = await get_products_by_retailer(session, retailer_id=current_retailer.id)
     return products
 
 
 @app.get("/retailers/locations", tags=["Retailer Workflow"])
-def get_retailer_locations():
+async def get_retailer_locations(request: Request, response: Response, session: AsyncSession = Depends(get_read_session)):
     """Returns a list of retailers with their coordinates for the map."""
-    with Session(engine) as session:
-        # Fetch retailers who have lat/lon set
-        statement = select(Retailer).where(Retailer.lat != None).where(Retailer.lon != None)
-        retailers = session.exec(statement).all()
+    headers = version_headers(await get_data_versions(session, "retailer"))
+    if is_not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Fetch retailers who have lat/lon set
+    statement = select(Retailer).where(Retailer.lat != None).where(Retailer.lon != None)
+    retailers = (await session.exec(statement)).all()
         
-        map_data = []
-        for r in retailers:
-            map_data.append({
-                "id": r.id,
-                "name": r.business_name,
-                "lat": r.lat,
-                "lon": r.lon,
-                "address": r.address
-            })
-        return map_data
+    map_data = []
+    for r in retailers:
+        map_data.append({
+            "id": r.id,
+            "name": r.business_name,
+            "lat": r.lat,
+            "lon": r.lon,
+            "address": r.address
+        })
+    response.headers.update(headers)
+    return map_data
+
+# The k retailers closest to a point, nearest first, optionally only those within radius km.
+# Answered from the in-memory grid index, so the map only needs the stores around the customer.
+@app.get("/retailers/nearby", response_model=List[RetailerNearby], tags=["Retailer Workflow"])
+async def get_nearby_retailers(
+    background_tasks: BackgroundTasks,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: Optional[float] = Query(default=None, gt=0, le=20000),   # km
+    k: int = Query(default=10, ge=1, le=100)
+):
+    if retailer_locator.claim_refresh():
+        background_tasks.add_task(reload_index, retailer_locator)
+    return retailer_locator.nearby(lat, lon, k, radius)
 
 
 @app.put("/retailer/products/{product_id}", response_model=ProductRead, tags=["Retailer Workflow"])
 async def update_product(
     product_id: int, 
     update_data: ProductUpdate,
-    current_retailer: Retailer = Depends(get_current_retailer)
+    current_retailer: Retailer = Depends(get_current_retailer),
+    session: AsyncSession = Depends(get_session)
 ):
     
-    product = await run_in_threadpool(get_product_by_id, product_id=product_id)
+    product = await get_product_by_id(session, product_id=product_id)
     
     # Check if product exists and belongs to the retailer
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     if product.retailer_id != current_retailer.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this product")
+    if update_data.category_id is not None and not category_registry.get(update_data.category_id):
+        raise HTTPException(status_code=400, detail="Unknown category")
         
-    updated_product = await run_in_threadpool(update_product_details, product=product, update_data=update_data)
+    updated_product = await update_product_details(session, product=product, update_data=update_data)
     return updated_product
 
 @app.get("/retailer/orders", response_model=List[OrderRecordsRead], tags=["Retailer Workflow"])
-async def get_my_orders(current_retailer: Retailer = Depends(get_current_retailer)):
+async def get_my_orders(current_retailer: Retailer = Depends(get_current_retailer), session: AsyncSession = Depends(get_session)):
     
-    orders = await run_in_threadpool(get_orders_by_retailer, retailer_id=current_retailer.id)
+    orders = await get_orders_by_retailer(session, retailer_id=current_retailer.id)
     # Note: This returns orders without the 'items' list populated.
     return orders
 
@@ -1162,39 +1412,39 @@ async def update_order(
     order_id: int,
     status_update: OrderStatusUpdate,
     background_tasks: BackgroundTasks, # <--- CRITICAL: ADD THIS
-    current_retailer: Retailer = Depends(get_current_retailer)
+    current_retailer: Retailer = Depends(get_current_retailer),
+    session: AsyncSession = Depends(get_session)
 ):
     # 1. Verification (Original logic)
-    retailer_orders = await run_in_threadpool(get_orders_by_retailer, retailer_id=current_retailer.id)
+    retailer_orders = await get_orders_by_retailer(session, retailer_id=current_retailer.id)
     order_ids = [order.id for order in retailer_orders]
     
     if order_id not in order_ids:
         raise HTTPException(status_code=403, detail="Not authorized to update this order")
         
     # 2. Get Order and Update DB
-    order = await run_in_threadpool(get_order_by_id, order_id=order_id)
+    order = await get_order_by_id(session, order_id=order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     new_status = status_update.status
     old_status = order.status # Capture status before updating
 
-    updated_order = await run_in_threadpool(update_order_status, order=order, status_update=status_update)
+    updated_order = await update_order_status(session, order=order, status_update=status_update)
 
     # 3. --- NEW: SEND EMAIL NOTIFICATION (Only if status changed) ---
     if new_status != old_status:
-        with Session(engine) as session:
-            # Fetch Customer details required for email
-            customer = session.get(Customer, updated_order.customer_id)
+        # Fetch Customer details required for email
+        customer = await session.get(Customer, updated_order.customer_id)
             
-            if customer:
-                await send_status_update_email(
-                    email=customer.mail,
-                    name=customer.name,
-                    order_id=updated_order.id,
-                    new_status=new_status,
-                    background_tasks=background_tasks
-                )
+        if customer:
+            await send_status_update_email(
+                email=customer.mail,
+                name=customer.name,
+                order_id=updated_order.id,
+                new_status=new_status,
+                background_tasks=background_tasks
+            )
     # -------------------------------------------------------------------
     
     return updated_order
@@ -1204,85 +1454,86 @@ async def update_order(
 # --- Wholesaler Workflow ---
 
 @app.put("/wholesaler/orders/{order_id}/status", response_model=WholesaleOrder, tags=["Wholesaler Workflow"])
-def update_wholesale_order_status(
+async def update_wholesale_order_status(
     order_id: int,
     status_update: OrderStatusUpdate,
-    current_wholesaler: Wholesaler = Depends(get_current_wholesaler)
+    current_wholesaler: Wholesaler = Depends(get_current_wholesaler),
+    session: AsyncSession = Depends(get_session)
 ):
-    with Session(engine) as session:
-        order = session.get(WholesaleOrder, order_id)
-        if not order: raise HTTPException(status_code=404, detail="Order not found")
-        if order.wholesaler_id != current_wholesaler.id: raise HTTPException(status_code=403, detail="Not authorized")
-            
-        # --- STATUS LOGIC ---
-        # If changing to "Shipped", add stock to Retailer
-        if status_update.status == "Shipped" and order.status != "Shipped":
-            items = session.exec(select(WholesaleOrderItem).where(WholesaleOrderItem.wholesale_order_id == order.id)).all()
+    order = await session.get(WholesaleOrder, order_id)
+    if not order: raise HTTPException(status_code=404, detail="Order not found")
+    if order.wholesaler_id != current_wholesaler.id: raise HTTPException(status_code=403, detail="Not authorized")
             
-            for item in items:
-                # Find product details from Wholesaler Inventory
-                ws_product = session.get(WholesalerProduct, item.product_id)
-                if not ws_product: continue
-
-                # Check if Retailer already has this product
-                retailer_product = session.exec(
-                    select(Product)
-                    .where(Product.retailer_id == order.retailer_id)
-                    .where(Product.name == ws_product.name)
-                ).first()
-
-                if retailer_product:
-                    retailer_product.stock += item.quantity
-                    session.add(retailer_product)
-                else:
-                    # Create new product for Retailer
-                    new_prod = Product(
-                        name=ws_product.name,
-                        price=ws_product.price * 1.2, # Default 20% markup
-                        stock=item.quantity,
-                        retailer_id=order.retailer_id,
-                        description="Sourced from Wholesaler",
-                        category_id=1, 
-                        image_url=ws_product.image_url
+    # --- STATUS LOGIC ---
+    # If changing to "Shipped", add stock to Retailer
+    if status_update.status == "Shipped" and order.status != "Shipped":
+        items = (await session.exec(select(WholesaleOrderItem).where(WholesaleOrderItem.wholesale_order_id == order.id))).all()
+
+        # Wholesaler inventory of every item, and the retailer's products with the same names, in two queries
+        ws_products = await get_by_ids(session, WholesalerProduct, [item.product_id for item in items])
+        names = {ws_product.name for ws_product in ws_products.values()}
+        retailer_products = {}
+        if names:
+            for product in (await session.exec(
+                select(Product)
+                .where(Product.retailer_id == order.retailer_id)
+                .where(col(Product.name).in_(names))
+                .order_by(Product.id)
+            )).all():
+                retailer_products.setdefault(product.name, product)
+
+        # Products new to the retailer go in the configured category; wholesale items carry none of their own
+        category_id = category_registry.id_for(WHOLESALE_DEFAULT_CATEGORY)
+
+        for item in items:
+            # Find product details from Wholesaler Inventory
+            ws_product = ws_products.get(item.product_id)
+            if not ws_product: continue
+
+            # Check if Retailer already has this product
+            retailer_product = retailer_products.get(ws_product.name)
+
+            if retailer_product:
+                retailer_product.stock += item.quantity
+                session.add(retailer_product)
+            else:
+                if category_id is None:
+                    raise HTTPException(
+                        status_code=409,
+                        detail=f"Category '{WHOLESALE_DEFAULT_CATEGORY}' for products sourced from wholesalers does not exist",
                     )
-                    session.add(new_prod)
+                # Create new product for Retailer
+                new_prod = Product(
+                    name=ws_product.name,
+                    price=ws_product.price * 1.2, # Default 20% markup
+                    stock=item.quantity,
+                    retailer_id=order.retailer_id,
+                    description="Sourced from Wholesaler",
+                    category_id=category_id,
+                    image_url=ws_product.image_url
+                )
+                session.add(new_prod)
+                retailer_products[new_prod.name] = new_prod
 
-        order.status = status_update.status
-        session.add(order)
-        session.commit()
-        session.refresh(order)
-        return order
+    order.status = status_update.status
+    session.add(order)
+    await session.flush()
+    return order
 
 # -------------------------------------------------------------------------------------------------------------------------------------------------
 
 # Password Forgot Endpoint
 @app.post("/auth/forgot-password" , status_code=status.HTTP_200_OK , tags=["Auth"])
-async def forgot_password(request: ForgotPasswordRequest , background_tasks: BackgroundTasks):
+async def forgot_password(request: ForgotPasswordRequest , background_tasks: BackgroundTasks, session: AsyncSession = Depends(get_session)):
 
     email = request.email
 
-    customer = await run_in_threadpool(get_customer_by_email, email)
-    retailer = await run_in_threadpool(get_retailer_by_email, email)
-    wholesaler = await run_in_threadpool(get_wholesaler_by_email, email)
-
-    if not (customer or retailer or wholesaler):
+    if not await get_identities_by_email(session, email):
         raise HTTPException(status_code=404 , detail="User with this mail does not exist")
     
+    # Replaces any earlier reset code for this email, valid for 10min
     otp = generate_otp()
-    expiration = datetime.utcnow() + timedelta(minutes=10) # OTP is valid for 10min
-
-    with Session(engine) as session:
-        
-        existing = session.exec(select(PasswordReset).where(PasswordReset.email == email)).all()
-
-        # Deleting the record if exists a already OTP request
-        for record in existing:
-            session.delete(record)
-
-        # Making a new one
-        reset_entry = PasswordReset(email=email, otp=otp, expires_at=expiration)
-        session.add(reset_entry)
-        session.commit()
+    await otp_store.save(session, "password_reset", email, otp)
 
     await send_otp_email(email , otp, background_tasks)
 
@@ -1291,82 +1542,51 @@ async def forgot_password(request: ForgotPasswordRequest , background_tasks: Bac
 
 # Password Reset Endpoint
 @app.post("/auth/reset-password", status_code=status.HTTP_200_OK, tags=['Auth'])
-def reset_password(request: ResetPasswordRequest): # Removed async
-    with Session(engine) as session:
-        # 1. Validate OTP
-        statement = select(PasswordReset).where(
-            (PasswordReset.email == request.email) &
-            (PasswordReset.otp == request.otp) 
-        )
-        reset_record = session.exec(statement).first()
+async def reset_password(request: ResetPasswordRequest, session: AsyncSession = Depends(get_session)):
+    # 1. Validate OTP (expired codes are left to the OTP sweeper)
+    otp_status = await otp_store.check(session, "password_reset", request.email, request.otp)
 
-        if not reset_record:
-            raise HTTPException(status_code=400, detail="Invalid OTP.")
+    if otp_status == OTP_INVALID:
+        raise HTTPException(status_code=400, detail="Invalid OTP.")
         
-        if reset_record.expires_at < datetime.utcnow():
-            session.delete(reset_record)
-            session.commit()
-            raise HTTPException(status_code=400, detail="OTP has expired.")
+    if otp_status == OTP_EXPIRED:
+        raise HTTPException(status_code=400, detail="OTP has expired.")
         
-        # 2. Update Password (Hash it once)
-        new_hashed_password = hash_password(request.new_password)
+    # 2. Update Password (Hash it once)
+    new_hashed_password = await hash_password_async(request.new_password)
         
-        user_found = False
-
-        # Check Customer (Always check)
-        customer = session.exec(select(Customer).where(Customer.mail == request.email)).first()
-        if customer:
-            customer.hashed_password = new_hashed_password
-            session.add(customer)
-            user_found = True
-
-        # Check Retailer (Always check - REMOVED "if not user_found")
-        retailer = session.exec(select(Retailer).where(Retailer.mail == request.email)).first()
-        if retailer:
-            retailer.hashed_password = new_hashed_password
-            session.add(retailer)
-            user_found = True
-
-        # Check Wholesaler (Always check - REMOVED "if not user_found")
-        wholesaler = session.exec(select(Wholesaler).where(Wholesaler.mail == request.email)).first()
-        if wholesaler:
-            wholesaler.hashed_password = new_hashed_password
-            session.add(wholesaler)
-            user_found = True
-        
-        if not user_found:
-            raise HTTPException(status_code=404, detail="User account not found.")
-
-        # 3. Delete the OTP
-        session.delete(reset_record)
-        session.commit()
+    # Every account registered with this email (customer, retailer and / or wholesaler)
+    accounts = await get_accounts_by_email(session, request.email)
+    for _, account in accounts:
+        account.hashed_password = new_hashed_password
+        session.add(account)
+
+    if not accounts:
+        raise HTTPException(status_code=404, detail="User account not found.")
+
+    # 3. Delete the OTP
+    await otp_store.discard(session, "password_reset", request.email)
+    await session.flush()
         
-        return {"message": "Password updated successfully. You can now login."}
+    return {"message": "Password updated successfully. You can now login."}
     
 
 # Verifying OTP
 @app.post("/auth/verify-otp-only", status_code=status.HTTP_200_OK, tags=["Auth"])
-async def verify_otp_only(request: OTPVerifyRequest):
+async def verify_otp_only(request: OTPVerifyRequest, session: AsyncSession = Depends(get_session)):
     """
     Checks if OTP is valid without resetting password or deleting the OTP.
     Used for the frontend 'Next' button.
     """
-    with Session(engine) as session:
-        statement = select(PasswordReset).where(
-            (PasswordReset.email == request.email) & 
-            (PasswordReset.otp == request.otp)
-        )
-        reset_record = session.exec(statement).first()
+    otp_status = await otp_store.check(session, "password_reset", request.email, request.otp)
 
-        if not reset_record:
-            raise HTTPException(status_code=400, detail="Invalid OTP Code.")
+    if otp_status == OTP_INVALID:
+        raise HTTPException(status_code=400, detail="Invalid OTP Code.")
 
-        if reset_record.expires_at < datetime.utcnow():
-            session.delete(reset_record) # Cleanup expired
-            session.commit()
-            raise HTTPException(status_code=400, detail="OTP has expired.")
+    if otp_status == OTP_EXPIRED:
+        raise HTTPException(status_code=400, detail="OTP has expired.")
             
-        return {"message": "OTP is valid."}
+    return {"message": "OTP is valid."}
 
 
 # ----------------------------------------------
@@ -1381,71 +1601,67 @@ async def send_contact_query(form: ContactForm, background_tasks: BackgroundTask
 # --- FEEDBACK SYSTEM ---
 
 @app.post("/feedback/add", response_model=Feedback, tags=["Products"])
-def add_product_feedback(
+async def add_product_feedback(
     feedback: FeedbackCreate,
-    customer: Customer = Depends(get_current_customer)
+    customer: Customer = Depends(get_current_customer),
+    session: AsyncSession = Depends(get_session)
 ):
-    with Session(engine) as session:
-        # Verify product exists
-        product = session.get(Product, feedback.product_id)
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-
-        new_feedback = Feedback(
-            product_id=feedback.product_id,
-            customer_id=customer.id,
-            rating=feedback.rating,
-            comment=feedback.comment
-        )
-        session.add(new_feedback)
-        session.commit()
-        session.refresh(new_feedback)
-        return new_feedback
+    # Verify product exists
+    product = await session.get(Product, feedback.product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    # The product's rating aggregates move in the same transaction as the review
+    return await add_feedback(session, product, customer.id, feedback.rating, feedback.comment)
 
 @app.get("/products/{product_id}/feedback", tags=["Products"])
-def get_product_reviews(product_id: int):
-    with Session(engine) as session:
-        # Join with Customer to get names
-        results = session.exec(
-            select(Feedback, Customer.name)
-            .join(Customer, Customer.id == Feedback.customer_id)
-            .where(Feedback.product_id == product_id)
-            .order_by(Feedback.created_at.desc())
-        ).all()
+async def get_product_reviews(product_id: int, request: Request, response: Response, session: AsyncSession = Depends(get_read_session)):
+    # Reviews show the author's name, so a customer renaming themselves changes the response too
+    headers = version_headers(await get_data_versions(session, "customer", "feedback"))
+    if is_not_modified(request, headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Join with Customer to get names
+    results = (await session.exec(
+        select(Feedback, Customer.name)
+        .join(Customer, Customer.id == Feedback.customer_id)
+        .where(Feedback.product_id == product_id)
+        .order_by(Feedback.created_at.desc())
+    )).all()
         
-        reviews = []
-        for fb, c_name in results:
-            reviews.append({
-                "user": c_name,
-                "rating": fb.rating,
-                "comment": fb.comment,
-                "date": fb.created_at
-            })
-        return reviews
+    reviews = []
+    for fb, c_name in results:
+        reviews.append({
+            "user": c_name,
+            "rating": fb.rating,
+            "comment": fb.comment,
+            "date": fb.created_at
+        })
+    response.headers.update(headers)
+    return reviews
 
 @app.get("/retailer/feedback", response_model=List[FeedbackRead], tags=["Retailer Workflow"])
-def get_retailer_feedback(current_retailer: Retailer = Depends(get_current_retailer)):
-    with Session(engine) as session:
-        # Get feedback for ALL products owned by this retailer
-        results = session.exec(
-            select(Feedback, Product.name, Customer.name)
-            .join(Product, Product.id == Feedback.product_id)
-            .join(Customer, Customer.id == Feedback.customer_id)
-            .where(Product.retailer_id == current_retailer.id)
-            .order_by(Feedback.created_at.desc())
-        ).all()
+async def get_retailer_feedback(current_retailer: Retailer = Depends(get_current_retailer), session: AsyncSession = Depends(get_session)):
+    # Get feedback for ALL products owned by this retailer
+    results = (await session.exec(
+        select(Feedback, Product.name, Customer.name)
+        .join(Product, Product.id == Feedback.product_id)
+        .join(Customer, Customer.id == Feedback.customer_id)
+        .where(Product.retailer_id == current_retailer.id)
+        .order_by(Feedback.created_at.desc())
+    )).all()
         
-        feedback_list = []
-        for fb, p_name, c_name in results:
-            feedback_list.append({
-                "id": fb.id,
-                "product_name": p_name,
-                "customer_name": c_name,
-                "rating": fb.rating,
-                "comment": fb.comment,
-                "created_at": fb.created_at
-            })
-        return feedback_list
+    feedback_list = []
+    for fb, p_name, c_name in results:
+        feedback_list.append({
+            "id": fb.id,
+            "product_name": p_name,
+            "customer_name": c_name,
+            "rating": fb.rating,
+            "comment": fb.comment,
+            "created_at": fb.created_at
+        })
+    return feedback_list
     
 # --- IN main.py ---
 
@@ -0,0 +1,105 @@
+# Schema migrations: applies the ordered scripts in migrations/ and records each one in the schemaversion table
+# Runs on every server start (main.py lifespan). Run from backend/app to apply or inspect by hand:
+#     python migrate.py           apply pending migrations
+#     python migrate.py status    show current / head version
+
+import importlib
+import pkgutil
+import re
+import sys
+
+from sqlalchemy import inspect, insert, func, select, text
+from sqlalchemy.schema import CreateTable
+
+import migrations
+from database import engine
+from db_models import SchemaVersion
+
+MIGRATION_NAME = re.compile(r"^v(\d{4})_\w+$")
+VERSION_TABLE = SchemaVersion.__table__
+
+
+# -----------------------------------------------------------------
+# Discovering Migrations
+# -----------------------------------------------------------------
+
+def load_migrations():
+    found = {}
+    for module_info in pkgutil.iter_modules(migrations.__path__):
+        match = MIGRATION_NAME.match(module_info.name)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in found:
+            raise RuntimeError(f"Two migrations share version {version}: {found[version]} and {module_info.name}")
+        found[version] = module_info.name
+    return sorted(found.items())
+
+
+MIGRATIONS = load_migrations()
+HEAD_VERSION = MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+# -----------------------------------------------------------------
+# Reading / Locking the Version
+# -----------------------------------------------------------------
+
+def get_current_version(connection):
+    # has_table() is a single catalog lookup, not a reflection of the whole schema
+    if not inspect(connection).has_table(VERSION_TABLE.name):
+        return 0
+    return connection.execute(select(func.max(VERSION_TABLE.c.version))).scalar() or 0
+
+
+# Several uvicorn workers boot at once during a deploy; only one may run a migration at a time.
+# The others wait here until the transaction ends and then see the new version.
+MIGRATION_LOCK_ID = 5_000_001
+
+def lock_version_table(connection):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+    else:
+        # Any write takes SQLite's database-wide write lock (held until commit, others wait on busy timeout)
+        connection.execute(VERSION_TABLE.update().where(VERSION_TABLE.c.version < 0).values(name=VERSION_TABLE.c.name))
+
+
+# -----------------------------------------------------------------
+# Applying Migrations
+# -----------------------------------------------------------------
+
+def migrate_db():
+    # Fast path for normal boots: one catalog lookup + one SELECT, no create_all / reflection
+    with engine.connect() as connection:
+        if get_current_version(connection) >= HEAD_VERSION:
+            return
+
+    with engine.begin() as connection:
+        connection.execute(CreateTable(VERSION_TABLE, if_not_exists=True))
+
+    for version, name in MIGRATIONS:
+        # One transaction per migration, so a failure leaves the schema at the last good version
+        with engine.begin() as connection:
+            lock_version_table(connection)
+            if get_current_version(connection) >= version:
+                continue
+            print(f"Applying migration {name}...")
+            importlib.import_module(f"migrations.{name}").upgrade(connection)
+            connection.execute(insert(VERSION_TABLE).values(version=version, name=name))
+
+
+def print_status():
+    with engine.connect() as connection:
+        current = get_current_version(connection)
+    print(f"Current schema version: {current}")
+    print(f"Head version:           {HEAD_VERSION}")
+    for version, name in MIGRATIONS:
+        state = "applied" if version <= current else "pending"
+        print(f"  [{state:7}] {name}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        print_status()
+    else:
+        migrate_db()
+        print_status()
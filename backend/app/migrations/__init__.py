@@ -0,0 +1,42 @@
+# Ordered schema migrations, applied by migrate.py
+#
+# Each migration is a module named vNNNN_short_name.py that defines:
+#     upgrade(connection)  -- runs inside a transaction, the version row is recorded in the same transaction
+#
+# v0001_initial builds a brand new database straight from db_models.py, so a fresh install already has
+# every later column and index. Later migrations must therefore be safe to run against a schema that
+# already has their change -- use the helpers below, they skip work that is already done.
+
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel
+
+import db_models  # noqa: F401  (registers every table on SQLModel.metadata)
+
+
+def get_index(name):
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    return None
+
+
+# Creates indexes declared in db_models.py (by name) if they do not exist yet.
+# Names no longer in db_models.py were replaced by a later migration and are skipped.
+def create_indexes(connection, *names):
+    for name in names:
+        index = get_index(name)
+        if index is not None:
+            index.create(bind=connection, checkfirst=True)
+
+
+def drop_indexes(connection, *names):
+    for name in names:
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+# Adds a column if the table does not have it yet. 'ddl' is the column definition, e.g. "rating_count INTEGER NOT NULL DEFAULT 0"
+def add_column(connection, table_name, column_name, ddl):
+    existing = {column["name"] for column in inspect(connection).get_columns(table_name)}
+    if column_name not in existing:
+        connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {ddl}"))
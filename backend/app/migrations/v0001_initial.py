@@ -0,0 +1,8 @@
+# Baseline schema: every table in db_models.py
+# On an existing livemart.db (created before migrations) this only adds the tables that are missing.
+
+from sqlmodel import SQLModel
+
+
+def upgrade(connection):
+    SQLModel.metadata.create_all(connection)
@@ -0,0 +1,32 @@
+# Indexes for the hot lookups and foreign keys (auth email lookups, catalog filters, carts, orders, reviews)
+# Databases created before these indexes were added to db_models.py do not have them yet.
+
+from migrations import create_indexes
+
+
+def upgrade(connection):
+    create_indexes(
+        connection,
+        # Email lookups on every authenticated request
+        "ix_customer_mail",
+        "ix_retailer_mail",
+        "ix_wholesaler_mail",
+        # Catalog
+        "ix_product_category_id",
+        "ix_product_price",
+        "ix_product_category_id_price",
+        "ix_product_retailer_id_name",
+        # Carts
+        "ix_shoppingcart_customer_id",
+        "ix_shoppingcartitem_cart_id_product_id",
+        # Orders
+        "ix_orderrecords_customer_id_order_date",
+        "ix_orderitem_orderrecords_id_product_id",
+        "ix_orderitem_product_id_orderrecords_id",
+        # Reviews
+        "ix_feedback_product_id_created_at",
+        # Wholesale
+        "ix_wholesalerproduct_wholesaler_id",
+        "ix_wholesaleorder_wholesaler_id_order_date",
+        "ix_wholesaleorderitem_wholesale_order_id",
+    )
@@ -0,0 +1,53 @@
+# Full-text index for product search (/products?q=), kept in sync by the database itself so ORM
+# writes, bulk inserts and raw SQL all stay searchable.
+#   SQLite:     FTS5 table over product.name / description + triggers
+#   PostgreSQL: generated tsvector column (name weighted over description) + GIN index
+
+from migrations import add_column
+
+SQLITE_STATEMENTS = [
+    # External-content table: the text lives in 'product', FTS5 only stores the index.
+    # prefix='2 3' adds prefix indexes so short search-as-you-type terms stay fast.
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        name, description,
+        content='product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_insert AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_delete AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_update AFTER UPDATE OF name, description ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO product_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    # Index the products that already exist
+    "INSERT INTO product_fts(product_fts) VALUES ('rebuild')",
+]
+
+POSTGRES_SEARCH_VECTOR = (
+    "search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+    ") STORED"
+)
+
+
+def upgrade(connection):
+    if connection.dialect.name == "postgresql":
+        add_column(connection, "product", "search_vector", POSTGRES_SEARCH_VECTOR)
+        connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_product_search_vector ON product USING GIN (search_vector)")
+    else:
+        for statement in SQLITE_STATEMENTS:
+            connection.exec_driver_sql(statement)
@@ -0,0 +1,19 @@
+# /products pages with a keyset cursor (sort key, id). These indexes match each sort exactly and
+# replace the single-column / (category_id, price) ones, which they cover as prefixes.
+
+from migrations import create_indexes, drop_indexes
+
+
+def upgrade(connection):
+    create_indexes(
+        connection,
+        "ix_product_category_id_id",
+        "ix_product_category_id_price_id",
+        "ix_product_price_id",
+    )
+    drop_indexes(
+        connection,
+        "ix_product_category_id",
+        "ix_product_price",
+        "ix_product_category_id_price",
+    )
@@ -0,0 +1,18 @@
+# Version counters behind the ETag / Last-Modified headers of the catalog endpoints (see data_versions.py)
+
+from datetime import datetime
+
+from sqlalchemy import select
+
+from db_models import DataVersion
+
+VERSIONED_TABLES = ("product", "category", "feedback", "retailer", "customer")
+
+
+def upgrade(connection):
+    DataVersion.__table__.create(bind=connection, checkfirst=True)
+    existing = set(connection.execute(select(DataVersion.name)).scalars())
+    now = datetime.utcnow()
+    rows = [{"name": name, "version": 1, "updated_at": now} for name in VERSIONED_TABLES if name not in existing]
+    if rows:
+        connection.execute(DataVersion.__table__.insert(), rows)
@@ -0,0 +1,13 @@
+# Per-product review aggregates (rating_sum / rating_count / rating_avg), so /products can show, sort
+# and filter by rating without reading Feedback. Existing reviews are counted in by the backfill.
+
+from migrations import add_column, create_indexes
+from database import backfill_product_ratings
+
+
+def upgrade(connection):
+    add_column(connection, "product", "rating_sum", "rating_sum INTEGER NOT NULL DEFAULT 0")
+    add_column(connection, "product", "rating_count", "rating_count INTEGER NOT NULL DEFAULT 0")
+    add_column(connection, "product", "rating_avg", "rating_avg FLOAT NOT NULL DEFAULT 0")
+    backfill_product_ratings(connection)
+    create_indexes(connection, "ix_product_category_id_rating_avg_id", "ix_product_rating_avg_id")
@@ -0,0 +1,16 @@
+# "Frequently bought together" table (filled by build_related.py) and its version counter
+
+from datetime import datetime
+
+from sqlalchemy import select
+
+from db_models import ProductRelation, DataVersion
+
+
+def upgrade(connection):
+    ProductRelation.__table__.create(bind=connection, checkfirst=True)
+    exists = connection.execute(select(DataVersion.name).where(DataVersion.name == "product_relation")).first()
+    if not exists:
+        connection.execute(
+            DataVersion.__table__.insert(), [{"name": "product_relation", "version": 1, "updated_at": datetime.utcnow()}]
+        )
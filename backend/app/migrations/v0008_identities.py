@@ -0,0 +1,9 @@
+# Identity table (email -> role and id of every account), filled from the three account tables
+
+from db_models import Identity
+from identities import sync_identities
+
+
+def upgrade(connection):
+    Identity.__table__.create(bind=connection, checkfirst=True)
+    sync_identities(connection)
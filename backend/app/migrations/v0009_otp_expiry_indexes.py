@@ -0,0 +1,7 @@
+# Indexes on the one-time code tables' expiry, for the sweeper that deletes expired codes in batches
+
+from migrations import create_indexes
+
+
+def upgrade(connection):
+    create_indexes(connection, "ix_passwordreset_expires_at", "ix_verificationotp_expires_at")
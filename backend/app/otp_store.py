@@ -0,0 +1,122 @@
+# Store for one-time codes: email verification and password reset
+#
+# Endpoints go through otp_store (save / check / discard) and never touch the tables directly, so the
+# backend is chosen by OTP_STORE:
+#   "db"      Codes live in the VerificationOTP / PasswordReset tables, written in the request's own
+#             transaction and shared by every worker. Expired rows are deleted in batches by the
+#             sweeper (sweep_expired_otps, started by the main.py lifespan).
+#   "memory"  Codes live in a dict in this process: a check is a dict lookup instead of a query. Only
+#             for a single worker (a code issued by one worker is unknown to the others), and codes are
+#             lost on restart. Changes apply immediately, not at commit.
+# A new code for an email replaces its previous one of the same purpose.
+
+import asyncio
+import hmac
+import threading
+from datetime import datetime, timedelta
+
+from sqlmodel import select, delete, col
+
+from config import OTP_STORE, OTP_SWEEP_SECONDS, OTP_SWEEP_BATCH
+from db_models import VerificationOTP, PasswordReset
+
+OTP_VALID = "valid"
+OTP_EXPIRED = "expired"
+OTP_INVALID = "invalid"
+
+# Purpose -> (table used by the database store, minutes a code stays valid)
+PURPOSES = {
+    "verification": (VerificationOTP, 30),
+    "password_reset": (PasswordReset, 10),
+}
+
+
+def _expiry(purpose):
+    return datetime.utcnow() + timedelta(minutes=PURPOSES[purpose][1])
+
+
+class DatabaseOTPStore:
+    async def save(self, session, purpose: str, email: str, otp: str):
+        model = PURPOSES[purpose][0]
+        await session.exec(delete(model).where(model.email == email))
+        session.add(model(email=email, otp=otp, expires_at=_expiry(purpose)))
+        await session.flush()
+
+    # OTP_VALID, OTP_EXPIRED (left for the sweeper) or OTP_INVALID
+    async def check(self, session, purpose: str, email: str, otp: str) -> str:
+        model = PURPOSES[purpose][0]
+        record = (await session.exec(select(model).where(model.email == email, model.otp == otp))).first()
+        if record is None:
+            return OTP_INVALID
+        if record.expires_at < datetime.utcnow():
+            return OTP_EXPIRED
+        return OTP_VALID
+
+    async def discard(self, session, purpose: str, email: str):
+        model = PURPOSES[purpose][0]
+        await session.exec(delete(model).where(model.email == email))
+
+    # Deletes expired codes, 'batch_size' rows per transaction so no long lock is held; returns the count
+    async def sweep(self, session_factory, batch_size: int = OTP_SWEEP_BATCH) -> int:
+        swept = 0
+        for model, _ in PURPOSES.values():
+            while True:
+                async with session_factory() as session:
+                    expired = select(model.id).where(model.expires_at < datetime.utcnow()).limit(batch_size)
+                    deleted = (await session.exec(delete(model).where(col(model.id).in_(expired)))).rowcount
+                    await session.commit()
+                swept += deleted
+                if deleted < batch_size:
+                    break
+        return swept
+
+
+class MemoryOTPStore:
+    def __init__(self):
+        self._codes = {}        # (purpose, email) -> (otp, expires_at)
+        self._lock = threading.Lock()
+
+    async def save(self, session, purpose: str, email: str, otp: str):
+        with self._lock:
+            self._codes[(purpose, email)] = (otp, _expiry(purpose))
+
+    async def check(self, session, purpose: str, email: str, otp: str) -> str:
+        with self._lock:
+            entry = self._codes.get((purpose, email))
+        if entry is None or not hmac.compare_digest(entry[0], otp):
+            return OTP_INVALID
+        if entry[1] < datetime.utcnow():
+            return OTP_EXPIRED
+        return OTP_VALID
+
+    async def discard(self, session, purpose: str, email: str):
+        with self._lock:
+            self._codes.pop((purpose, email), None)
+
+    async def sweep(self, session_factory=None, batch_size: int = OTP_SWEEP_BATCH) -> int:
+        now = datetime.utcnow()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._codes.items() if expires_at < now]
+            for key in expired:
+                del self._codes[key]
+        return len(expired)
+
+
+OTP_STORES = {"db": DatabaseOTPStore, "memory": MemoryOTPStore}
+
+otp_store = OTP_STORES[OTP_STORE]()
+
+
+# -----------------------------------------------------------------
+# Sweeper
+# -----------------------------------------------------------------
+
+# Runs until cancelled (main.py lifespan), sweeping every OTP_SWEEP_SECONDS
+async def sweep_expired_otps(session_factory):
+    while True:
+        await asyncio.sleep(OTP_SWEEP_SECONDS)
+        try:
+            await otp_store.sweep(session_factory)
+        except Exception as e:
+            # Try again next round (e.g. the database was briefly unreachable)
+            print(f"OTP SWEEP ERROR: {str(e)}")
@@ -0,0 +1,108 @@
+# Password hashing: versioned hash formats, and a process pool that keeps the KDF off the event loop
+#
+# New hashes are scrypt (hashlib, backed by OpenSSL), stored with their parameters so they can be
+# raised later without breaking existing accounts:
+#     scrypt$<log2 n>$<r>$<p>$<salt, base64>$<hash, base64>
+# Accounts created before that hold a bare sha256 hex digest. It is still accepted at login, and
+# needs_rehash() tells the login endpoint to replace it (or scrypt hashes made with older parameters)
+# with the current format while it has the plain password at hand.
+#
+# A hash takes tens of milliseconds on purpose, so async endpoints use hash_password_async /
+# check_password_async, which run it in a pool of PASSWORD_HASH_WORKERS processes: a burst of logins
+# queues up there instead of stalling every other request. Scripts call the plain functions.
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from config import PASSWORD_HASH_WORKERS, PASSWORD_SCRYPT_LOG_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P
+
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def _scrypt(password: str, salt: bytes, log_n: int, r: int, p: int) -> bytes:
+    n = 1 << log_n
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p, dklen=HASH_BYTES, maxmem=128 * r * (n + p + 2)
+    )
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def hash_password(password: str) -> str:
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, PASSWORD_SCRYPT_LOG_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+    return f"scrypt${PASSWORD_SCRYPT_LOG_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    if hashed_password.startswith("scrypt$"):
+        try:
+            _, log_n, r, p, salt, digest = hashed_password.split("$")
+            expected = base64.b64decode(digest)
+            actual = _scrypt(password, base64.b64decode(salt), int(log_n), int(r), int(p))
+        except ValueError:
+            return False
+        return hmac.compare_digest(actual, expected)
+    # Legacy format: unsalted sha256 hex digest
+    return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), hashed_password)
+
+
+# True when the hash is not in the current format / parameters and should be replaced at next login
+def needs_rehash(hashed_password: str) -> bool:
+    current = f"scrypt${PASSWORD_SCRYPT_LOG_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}$"
+    return not hashed_password.startswith(current)
+
+
+# Verification and, when it succeeds on an outdated hash, its replacement, in one trip to the pool.
+# Returns (password matches, new hash to store or None).
+def check_password(password: str, hashed_password: str):
+    if not verify_password(password, hashed_password):
+        return False, None
+    if needs_rehash(hashed_password):
+        return True, hash_password(password)
+    return True, None
+
+
+# -----------------------------------------------------------------
+# Process Pool
+# -----------------------------------------------------------------
+# Created on first use. "spawn" starts clean interpreters instead of forking a process that already
+# runs the event loop, DB connection threads and the in-memory indexes.
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_password_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), hash_password, password)
+
+
+async def check_password_async(password: str, hashed_password: str):
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), check_password, password, hashed_password)
@@ -0,0 +1,125 @@
+# Renders product placeholder images locally (dark background, neon blue product name),
+# the same look as the placehold.co images populate_db.py used to download one by one.
+# Run from backend/app to fill in images for every product in the database that has none yet:
+#     python placeholder_images.py [--workers N]
+# The file format follows the product's image_url extension (.jpg or .webp).
+
+import argparse
+import math
+import os
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from database import DATA_DIR
+
+IMAGE_SIZE = (600, 400)
+BACKGROUND = "#1a1a1a"
+TEXT_COLOR = ImageColor.getrgb("#00f3ff")
+FONT_SIZE = 40
+WRAP_WIDTH = 22         # characters per line
+
+LINE_SPACING = 10
+JPEG_QUALITY = 80
+
+# Loaded once per worker process, not per image
+_font = None
+_glyphs = {}        # character -> (mask, advance width)
+
+
+def get_font():
+    global _font
+    if _font is None:
+        _font = ImageFont.load_default(size=FONT_SIZE)
+    return _font
+
+
+# FreeType rendering is most of the cost of an image, and product names reuse the same few dozen
+# characters, so each character is rendered once per process and pasted from then on
+def get_glyph(char):
+    glyph = _glyphs.get(char)
+    if glyph is None:
+        font = get_font()
+        ascent, descent = font.getmetrics()
+        advance = font.getlength(char)
+        width = max(math.ceil(advance), font.getbbox(char)[2], 1)
+        mask = Image.new("L", (width, ascent + descent), 0)
+        ImageDraw.Draw(mask).text((0, 0), char, fill=255, font=font)
+        glyph = _glyphs[char] = (mask, advance)
+    return glyph
+
+
+def render_placeholder(path, label):
+    image = Image.new("RGB", IMAGE_SIZE, BACKGROUND)
+    lines = textwrap.wrap(label, WRAP_WIDTH)[:4]
+    ascent, descent = get_font().getmetrics()
+    line_height = ascent + descent + LINE_SPACING
+    y = (IMAGE_SIZE[1] - (line_height * len(lines) - LINE_SPACING)) / 2
+
+    # Each line centered, the block of lines centered vertically
+    for line in lines:
+        glyphs = [get_glyph(char) for char in line]
+        x = (IMAGE_SIZE[0] - sum(advance for _, advance in glyphs)) / 2
+        for mask, advance in glyphs:
+            image.paste(TEXT_COLOR, (round(x), round(y)), mask)
+            x += advance
+        y += line_height
+
+    if path.endswith(".webp"):
+        image.save(path, "WEBP", quality=JPEG_QUALITY, method=0)    # method 0 = fastest encoder
+    else:
+        image.save(path, "JPEG", quality=JPEG_QUALITY)
+
+
+def _render_job(job):
+    render_placeholder(*job)
+
+
+# 'products' is an iterable of (image_url, name), image_url relative to backend/data like Product.image_url
+# ("product_images/12.jpg"). Files that already exist are skipped.
+def generate_images(products, workers=None):
+    jobs = []
+    skipped = 0
+    for image_url, name in products:
+        path = os.path.join(DATA_DIR, image_url)
+        if os.path.exists(path):
+            skipped += 1
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            jobs.append((path, name))
+
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    if workers == 1 or len(jobs) < 100:
+        # Not worth starting processes for a handful of images
+        for job in jobs:
+            _render_job(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(_render_job, jobs, chunksize=256):
+                pass
+    elapsed = time.perf_counter() - started
+
+    rate = len(jobs) / elapsed if elapsed else 0
+    print(f" - Images: rendered {len(jobs):,} in {elapsed:.1f}s ({rate:,.0f} images/s, {workers} workers), skipped {skipped:,} existing")
+    return len(jobs)
+
+
+if __name__ == "__main__":
+    from sqlmodel import Session, select
+    from database import engine
+    from db_models import Product
+
+    parser = argparse.ArgumentParser(description="Render placeholder images for products without one")
+    parser.add_argument("--workers", type=int, default=None, help="Processes to use (default: all CPUs)")
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        products = session.exec(
+            select(Product.image_url, Product.name)
+            .where(Product.image_url.like("product_images/%.jpg") | Product.image_url.like("product_images/%.webp"))
+            .order_by(Product.id)
+        ).all()
+    generate_images(products, workers=args.workers)
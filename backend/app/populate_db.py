@@ -1,14 +1,26 @@
+# Sample catalogue for local development: 240 products of the sample retailer (ID 1), with images
+# Run from backend/app:
+#     python populate_db.py
+# Reseeding replaces only the sample retailer's products. Orders and reviews are never deleted: a
+# product someone ordered or reviewed is kept (with its history), the rest go with their cart items
+# and relations. Other retailers' products are not touched.
+#     python populate_db.py --reset
+# wipes every product first, and with them ALL orders, reviews, cart items and relations (every
+# retailer's). It asks for confirmation.
+
+import argparse
 import os
 import random
-import requests # pip install requests
-from sqlmodel import Session, select, delete
+from sqlmodel import Session, select
 from db_models import Product, Category, Retailer
-from database import engine, create_db_and_tables, add_retailer, add_category, add_product
+from database import engine, sync_id_sequence, get_next_id, bulk_insert_products
+from migrate import migrate_db
 from auth import hash_password
+from placeholder_images import generate_images
+from fix_db import clear_products, clear_unused_products
 
 # --- CONFIGURATION ---
 RETAILER_ID = 1
-IMAGE_DIR = "../data/product_images"
 ITEMS_PER_CATEGORY = 40  # Updated to 40
 
 # --- CATEGORY MAPPING ---
@@ -55,41 +67,22 @@ POOLS = {
     }
 }
 
-# --- DOWNLOAD HELPER ---
-def download_image(product_id, text_label):
-    if not os.path.exists(IMAGE_DIR):
-        os.makedirs(IMAGE_DIR)
-    
-    path = os.path.join(IMAGE_DIR, f"{product_id}.jpg")
-    if os.path.exists(path):
-        return # Skip existing
-
-    # Placeholder service: Dark Background, Neon Blue Text
-    safe_text = text_label.replace(" ", "+")
-    url = f"https://placehold.co/600x400/1a1a1a/00f3ff.jpg?text={safe_text}&font=montserrat"
-
-    try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            with open(path, 'wb') as f:
-                f.write(response.content)
-    except Exception as e:
-        print(f"Error downloading {text_label}: {e}")
-
 def get_category_url(text):
     safe_text = text.replace(" ", "+")
     return f"https://placehold.co/600x400/1a1a1a/00f3ff.jpg?text={safe_text}"
 
 # --- MAIN SEEDER ---
-def seed_manual_db():
+def seed_manual_db(reset=False):
     print(f"--- Starting {ITEMS_PER_CATEGORY * 6} Product Seeding (40 per category) ---")
-    create_db_and_tables()
+    migrate_db()
     
     # 1. Clear Old Products
-    print("Clearing old products...")
-    with Session(engine) as session:
-        session.exec(delete(Product))
-        session.commit()
+    if reset:
+        print("Clearing all products, orders and reviews...")
+        clear_products()
+    else:
+        print(f"Clearing old products of retailer {RETAILER_ID}...")
+        clear_unused_products(RETAILER_ID)
         
     # 2. Ensure Categories
     print("Ensuring Categories exist...")
@@ -100,6 +93,8 @@ def seed_manual_db():
             if not existing:
                 new_cat = Category(id=cat_id, name=name, description=f"All {name}", image_url=cat_img)
                 session.add(new_cat)
+                session.flush()
+                sync_id_sequence(session.connection(), "category")
                 session.commit()
             else:
                 if existing.name != name:
@@ -112,14 +107,20 @@ def seed_manual_db():
         retailer = session.get(Retailer, RETAILER_ID)
         if not retailer:
             print("Creating Retailer ID 1...")
-            retailer = add_retailer(
-                name="Super Retailer", mail="admin@shop.com", hashed_password=hash_password("admin123"),
+            retailer = Retailer(
+                id=RETAILER_ID, name="Super Retailer", mail="admin@shop.com", hashed_password=hash_password("admin123"),
                 business_name="Live Mart Official", address="123 Main St", city="Hyderabad", state="Telangana", pincode="500001"
             )
+            session.add(retailer)
+            session.flush()
+            sync_id_sequence(session.connection(), "retailer")
+            session.commit()
 
     # 4. Generate Products
-    total_created = 0
-    
+    # Ids are assigned up front so image_url is known at insert time (one write per product)
+    next_id = get_next_id(Product)
+    rows = []
+
     for cat_name, pool in POOLS.items():
         cat_id = CATEGORY_IDS[cat_name]
         print(f"Generating {ITEMS_PER_CATEGORY} items for {cat_name} (ID: {cat_id})...")
@@ -153,32 +154,36 @@ def seed_manual_db():
             else: price = round(random.uniform(300, 5000), 2) 
             
             stock = 0 if random.random() < 0.08 else random.randint(5, 150)
-            
-            with Session(engine) as session:
-                p = Product(
-                    name=name,
-                    description=f"High quality {name} in {cat_name} category.",
-                    category_id=cat_id,
-                    price=price,
-                    stock=stock,
-                    retailer_id=RETAILER_ID,
-                    image_url="" 
-                )
-                session.add(p)
-                session.commit()
-                session.refresh(p)
-                
-                p.image_url = f"product_images/{p.id}.jpg"
-                session.add(p)
-                session.commit()
-                
-                download_image(p.id, name)
-                
-            total_created += 1
-            if total_created % 20 == 0:
-                print(f" - Created {total_created} products total...")
+
+            rows.append({
+                "id": next_id,
+                "name": name,
+                "description": f"High quality {name} in {cat_name} category.",
+                "category_id": cat_id,
+                "price": price,
+                "stock": stock,
+                "retailer_id": RETAILER_ID,
+                "image_url": f"product_images/{next_id}.jpg"
+            })
+            next_id += 1
+
+    total_created = bulk_insert_products(rows)
+    print(f" - Inserted {total_created} products, rendering images...")
+
+    # 5. Product Images (rendered locally, no network)
+    generate_images((row["image_url"], row["name"]) for row in rows)
 
     print(f"\n--- ✅ Success! Created {total_created} Products across 6 Categories. ---")
 
 if __name__ == "__main__":
-    seed_manual_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Seed the sample retailer's products")
+    parser.add_argument(
+        "--reset", action="store_true",
+        help="Delete every product first, with ALL orders, reviews, cart items and relations",
+    )
+    args = parser.parse_args()
+    if args.reset:
+        answer = input("This deletes every product, order and review in the database. Type 'reset' to continue: ")
+        if answer.strip() != "reset":
+            raise SystemExit("Aborted, nothing was deleted.")
+    seed_manual_db(reset=args.reset)
\ No newline at end of file
@@ -0,0 +1,133 @@
+# Cache of the accounts behind JWTs (LRU + TTL), for the get_current_* auth dependencies
+#
+# Every authenticated request resolves its token's (role, email) to a Customer / Retailer / Wholesaler
+# row. The column values of that row are cached here, and a hit is attached to the request session
+# with merge(load=False), so the endpoint gets a normal persistent object without a query.
+# When a transaction that changes an account commits (profile edits, password reset, verification,
+# deletion), the session events below drop its entry. The cache is per worker process;
+# PRINCIPAL_CACHE_TTL bounds how long another worker's change to an account can go unnoticed.
+#
+# A cached account is therefore only safe to read. Code that changes it must session.refresh() it
+# first, or write the change as an SQL expression (Customer.no_of_purchases + 1 at checkout), or it
+# writes stale values back and loses other transactions' updates.
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel import Session
+
+from config import PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL
+from identities import ROLE_MODELS, MODEL_ROLES
+
+
+class PrincipalCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()     # (role, email) -> (expires_at, column values), oldest first
+        self._lock = threading.Lock()
+        # Bumped on every invalidation. An account read while a change to it committed may be stale,
+        # so put() only stores it if the generation is still the one seen before the query ran.
+        self.generation = 0
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    # The cached account as a fresh detached instance (the caller attaches it to its session), or None
+    def get(self, role: str, email: str):
+        key = (role, email)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            expires_at, values = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.counters["expirations"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+
+        user = ROLE_MODELS[role](**values)
+        make_transient_to_detached(user)
+        return user
+
+    def put(self, role: str, user, generation: int):
+        values = {attr.key: getattr(user, attr.key) for attr in inspect(user).mapper.column_attrs}
+        key = (role, user.mail)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def invalidate(self, keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else None,
+                **self.counters,
+            }
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
+# -----------------------------------------------------------------
+# Write-Driven Invalidation
+# -----------------------------------------------------------------
+# Collect (role, email) of every account the transaction changes or deletes (old and new email when
+# it changes), then invalidate once the commit has succeeded.
+
+def _account_keys(session):
+    changed = set()
+    for obj in session.deleted:
+        role = MODEL_ROLES.get(type(obj))
+        if role is not None:
+            changed.add((role, obj.mail))
+    for obj in session.dirty:
+        role = MODEL_ROLES.get(type(obj))
+        if role is not None and session.is_modified(obj):
+            changed.add((role, obj.mail))
+            changed.update((role, mail) for mail in inspect(obj).attrs.mail.history.deleted)
+    return changed
+
+
+@event.listens_for(Session, "before_flush")
+def collect_changed_accounts(session, flush_context, instances):
+    changed = _account_keys(session)
+    if changed:
+        session.info.setdefault("changed_accounts", set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_changed_accounts(session):
+    changed = session.info.pop("changed_accounts", None)
+    if changed:
+        principal_cache.invalidate(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_changed_accounts(session):
+    session.info.pop("changed_accounts", None)
@@ -0,0 +1,285 @@
+# In-memory spatial index of retailer locations for /retailers/nearby
+#
+# Retailers are bucketed into a uniform lat / lon grid (RETAILER_GRID_DEGREES per cell). A query visits
+# the cells in rings around the caller's cell, nearest ring first, and stops as soon as no retailer in
+# a further ring can be closer than the k-th one found (or than the radius), so it only looks at the
+# neighbourhood instead of every retailer. Far from every store, where rings would be mostly empty,
+# it ranks coarser blocks of cells by distance instead. Distances are great-circle (haversine) km.
+# Longitude cells wrap around at the antimeridian, and a ring that reaches a pole is no longer a
+# usable bound (the other side of the pole is a few cells away, half the globe in longitude), so a
+# query near a pole ranks the blocks too.
+#
+# Loaded at startup (main.py lifespan). The session events below apply retailer signups, location
+# changes and deletions once their transaction commits; writes made by other workers or scripts are
+# picked up by a full reload every RETAILER_INDEX_REFRESH_SECONDS.
+
+import heapq
+import math
+import threading
+import time
+
+from sqlalchemy import event, inspect
+from sqlmodel import Session, select
+
+from config import RETAILER_GRID_DEGREES, RETAILER_INDEX_REFRESH_SECONDS
+from db_models import Retailer
+
+EARTH_RADIUS_KM = 6371.0088
+LOCATION_FIELDS = ("lat", "lon", "business_name", "address")
+BLOCK_CELLS = 32        # Cells per side of a block, the coarse level used for far-away queries
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _location(retailer):
+    if retailer.lat is None or retailer.lon is None:
+        return None
+    return {
+        "id": retailer.id,
+        "name": retailer.business_name,
+        "lat": retailer.lat,
+        "lon": retailer.lon,
+        "address": retailer.address,
+    }
+
+
+class RetailerLocator:
+    def __init__(self, cell_degrees: float, refresh_seconds: float):
+        # A whole number of cells around the globe, so the cell east of the last one is the first one
+        self.lon_cells = max(1, round(360 / cell_degrees))
+        self.cell_degrees = 360 / self.lon_cells
+        self.refresh_seconds = refresh_seconds
+        self._locations = {}    # retailer id -> {"id", "name", "lat", "lon", "address"}
+        self._cells = {}        # (lat cell, lon cell) -> set of retailer ids
+        self._blocks = {}       # (lat block, lon block) -> set of occupied cells, BLOCK_CELLS x BLOCK_CELLS cells each
+        self._lock = threading.Lock()
+        self._refresh_at = 0.0
+
+    def _cell(self, lat: float, lon: float):
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees) % self.lon_cells
+
+    def _insert(self, cells, blocks, retailer_id, location):
+        cell = self._cell(location["lat"], location["lon"])
+        cells.setdefault(cell, set()).add(retailer_id)
+        blocks.setdefault((cell[0] // BLOCK_CELLS, cell[1] // BLOCK_CELLS), set()).add(cell)
+
+    # -------------------------------------------------------------
+    # Loading
+    # -------------------------------------------------------------
+
+    # 'session' is a sync Session: Session(engine) at startup, or the background reload
+    def load(self, session):
+        retailers = session.exec(
+            select(Retailer).where(Retailer.lat != None).where(Retailer.lon != None)
+        ).all()
+
+        locations = {retailer.id: _location(retailer) for retailer in retailers}
+        cells = {}
+        blocks = {}
+        for retailer_id, location in locations.items():
+            self._insert(cells, blocks, retailer_id, location)
+        with self._lock:
+            self._locations = locations
+            self._cells = cells
+            self._blocks = blocks
+            self._refresh_at = time.monotonic() + self.refresh_seconds
+
+    # True for one caller once the index is older than refresh_seconds; that caller reloads it
+    def claim_refresh(self):
+        with self._lock:
+            if time.monotonic() < self._refresh_at:
+                return False
+            self._refresh_at = time.monotonic() + self.refresh_seconds
+            return True
+
+    # -------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------
+
+    # Lower bound on the distance from (lat, lon) to any point outside the block of cells within
+    # 'ring' - 1 of its own cell: the nearest of the block's two parallels and two meridians.
+    # None once the block reaches a pole, where it no longer bounds anything.
+    def _outside_ring_km(self, lat, lon, ring):
+        center_lat, center_lon = self._cell(lat, lon)
+        south = (center_lat - ring + 1) * self.cell_degrees
+        north = (center_lat + ring) * self.cell_degrees
+        if south <= -90 or north >= 90:
+            return None
+        lat_gap = math.radians(min(lat - south, north - lat)) * EARTH_RADIUS_KM
+        if 2 * ring - 1 >= self.lon_cells:
+            return lat_gap      # The block goes all the way around
+        # Offsets from the block's west edge, in [0, 360)
+        offset = (lon - (center_lon - ring + 1) * self.cell_degrees) % 360
+        width = (2 * ring - 1) * self.cell_degrees
+        lon_gap = math.radians(min(offset, width - offset, 90.0))
+        meridian_km = EARTH_RADIUS_KM * math.asin(math.cos(math.radians(lat)) * math.sin(lon_gap))
+        return min(lat_gap, meridian_km)
+
+    # Distance from (lat, lon) to the nearest point of a lat / lon box: on its nearer meridian (or due
+    # north / south when lon is inside the box), at the closest latitude the box has
+    def _box_km(self, lat, lon, south, west, size):
+        offset = (lon - west) % 360
+        if offset <= size:
+            edge = lon
+        else:
+            edge = west if 360 - offset < offset - size else west + size
+        # Along a meridian the distance has a single minimum; outside the box it is at one of the box's ends
+        phi, d_lambda = math.radians(lat), math.radians(edge - lon)
+        closest = math.degrees(math.atan2(math.sin(phi), math.cos(phi) * math.cos(d_lambda)))
+        candidates = (closest,) if south <= closest <= south + size else (south, south + size)
+        distance = min(haversine_km(lat, lon, candidate, edge) for candidate in candidates)
+        return distance - 1e-6      # rounding must not make it a hair too far
+
+    # Once a ring is wider than the globe it overlaps itself and earlier rings; nearby() skips the
+    # cells it has already visited
+    def _ring_cells(self, center, ring):
+        lat_cell, lon_cell = center
+        if ring == 0:
+            yield center
+            return
+        for d in range(-ring, ring + 1):
+            yield lat_cell - ring, (lon_cell + d) % self.lon_cells
+            yield lat_cell + ring, (lon_cell + d) % self.lon_cells
+        for d in range(-ring + 1, ring):
+            yield lat_cell + d, (lon_cell - ring) % self.lon_cells
+            yield lat_cell + d, (lon_cell + ring) % self.lon_cells
+
+    # The k retailers nearest to (lat, lon), closest first, optionally only those within radius_km.
+    # Each result is the retailer's location dict plus "distance_km".
+    def nearby(self, lat: float, lon: float, k: int, radius_km: float = None):
+        with self._lock:
+            center = self._cell(lat, lon)
+            best = []           # max-heap of the k closest so far: (-distance, id)
+
+            def visit(retailer_ids):
+                for retailer_id in retailer_ids:
+                    location = self._locations[retailer_id]
+                    distance = haversine_km(lat, lon, location["lat"], location["lon"])
+                    if radius_km is not None and distance > radius_km:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, retailer_id))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, retailer_id))
+
+            def beyond(bound):
+                return (radius_km is not None and bound > radius_km) or (len(best) == k and bound > -best[0][0])
+
+            # Walk the rings while they cost fewer cell lookups than there are occupied cells
+            ring = 0
+            budget = len(self._cells)
+            visited = set()
+            while True:
+                bound = self._outside_ring_km(lat, lon, ring) if ring else 0.0
+                if bound is not None and beyond(bound):
+                    break
+                if bound is None or 8 * ring > budget:
+                    self._visit_far(lat, lon, visited, visit, beyond)
+                    break
+                budget -= max(8 * ring, 1)
+                for cell in self._ring_cells(center, ring):
+                    retailer_ids = self._cells.get(cell)
+                    if retailer_ids and cell not in visited:
+                        visited.add(cell)
+                        visit(retailer_ids)
+                ring += 1
+
+            results = []
+            for negative_distance, retailer_id in sorted(best, reverse=True):
+                results.append({**self._locations[retailer_id], "distance_km": round(-negative_distance, 3)})
+            return results
+
+    # Mostly empty rings from here on (a query far from every store, or next to a pole): go through
+    # the occupied blocks nearest first, and through their cells the rings have not visited, with the
+    # same stopping rule
+    def _visit_far(self, lat, lon, visited, visit, beyond):
+        block_degrees = BLOCK_CELLS * self.cell_degrees
+        blocks = sorted(
+            (self._box_km(lat, lon, block[0] * block_degrees, block[1] * block_degrees, block_degrees), block)
+            for block in self._blocks
+        )
+        for bound, block in blocks:
+            if beyond(bound):
+                break
+            cells = sorted(
+                (self._box_km(lat, lon, cell[0] * self.cell_degrees, cell[1] * self.cell_degrees, self.cell_degrees), cell)
+                for cell in self._blocks[block]
+                if cell not in visited
+            )
+            for cell_bound, cell in cells:
+                if beyond(cell_bound):
+                    break
+                visit(self._cells[cell])
+
+    # -------------------------------------------------------------
+    # Incremental updates (called after a commit)
+    # -------------------------------------------------------------
+
+    def _remove(self, retailer_id):
+        location = self._locations.pop(retailer_id, None)
+        if location is None:
+            return
+        cell = self._cell(location["lat"], location["lon"])
+        retailer_ids = self._cells[cell]
+        retailer_ids.discard(retailer_id)
+        if not retailer_ids:
+            del self._cells[cell]
+            block = (cell[0] // BLOCK_CELLS, cell[1] // BLOCK_CELLS)
+            self._blocks[block].discard(cell)
+            if not self._blocks[block]:
+                del self._blocks[block]
+
+    # 'changes' maps retailer id -> location dict, or None for a retailer that is gone / has no location
+    def apply(self, changes):
+        with self._lock:
+            for retailer_id, location in changes.items():
+                self._remove(retailer_id)
+                if location is not None:
+                    self._locations[retailer_id] = location
+                    self._insert(self._cells, self._blocks, retailer_id, location)
+
+
+retailer_locator = RetailerLocator(RETAILER_GRID_DEGREES, RETAILER_INDEX_REFRESH_SECONDS)
+
+
+# -----------------------------------------------------------------
+# Write-Driven Updates
+# -----------------------------------------------------------------
+# after_flush sees the pre-flush new / dirty / deleted sets with ids already assigned. Changes are
+# collected per transaction and applied once it commits.
+
+@event.listens_for(Session, "after_flush")
+def collect_retailer_locations(session, flush_context):
+    changes = {}
+    for obj in session.new:
+        if isinstance(obj, Retailer):
+            changes[obj.id] = _location(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Retailer):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in LOCATION_FIELDS):
+                changes[obj.id] = _location(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Retailer):
+            changes[obj.id] = None
+
+    if changes:
+        session.info.setdefault("retailer_locations", {}).update(changes)
+
+
+@event.listens_for(Session, "after_commit")
+def apply_retailer_locations(session):
+    changes = session.info.pop("retailer_locations", None)
+    if changes:
+        retailer_locator.apply(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_retailer_locations(session):
+    session.info.pop("retailer_locations", None)
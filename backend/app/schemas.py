@@ -2,7 +2,7 @@
 
 
     # BaseModel for defining request/response schemas
-from pydantic import BaseModel , EmailStr   # EmailStr helps validate proper email structure
+from pydantic import BaseModel , EmailStr, Field   # EmailStr helps validate proper email structure
 from typing import Optional , List
 from datetime import datetime
 
@@ -170,6 +170,8 @@ class ProductRead(BaseModel):
     category_id: Optional[int] = None
     retailer_id: int
     image_url: Optional[str]
+    rating_avg: float = 0       # Average stars, 0 until the first review
+    rating_count: int = 0
 
     class Config:
         from_attributes = True
@@ -192,6 +194,48 @@ class CategoryRead(BaseModel):
     class Config:
         from_attributes = True
 
+# /categories: each category with how many products it lists and how many of those are in stock
+class CategoryReadWithCounts(CategoryRead):
+    product_count: int
+    in_stock_count: int
+
+# /products/facets
+class CategoryFacet(BaseModel):
+    id: Optional[int]           # None counts products without a category
+    name: Optional[str]
+    count: int
+
+class PriceBucketFacet(BaseModel):
+    min_price: float
+    max_price: Optional[float]  # Exclusive, None for the open-ended top bucket
+    count: int
+
+# /retailers/nearby
+class RetailerNearby(BaseModel):
+    id: int
+    name: str
+    lat: float
+    lon: float
+    address: Optional[str] = None
+    distance_km: float
+
+# /products/suggest
+class Suggestion(BaseModel):
+    id: int
+    name: str
+
+class ProductSuggestions(BaseModel):
+    categories: List[Suggestion]
+    terms: List[str]            # Words from product names (brands, product types) completing the last word typed
+    products: List[Suggestion]
+
+class ProductFacets(BaseModel):
+    total: int
+    categories: List[CategoryFacet]
+    price_buckets: List[PriceBucketFacet]
+    in_stock: int
+    out_of_stock: int
+
 # --------------------------------------------------------------------------------------------------------------------------------------------
 
 
@@ -331,7 +375,7 @@ class ContactForm(BaseModel):
 
 class FeedbackCreate(BaseModel):
     product_id: int
-    rating: int
+    rating: int = Field(ge=1, le=5)     # Stars, averaged into Product.rating_avg
     comment: Optional[str] = None
 
 class FeedbackRead(BaseModel):
@@ -0,0 +1,277 @@
+# In-memory prefix index for /products/suggest (search box autocomplete)
+#
+# Every word of every product name (brands, product types, adjectives) is a key in a sorted word list,
+# so the words starting with a prefix are one bisect away. Each word has a posting list of the products
+# whose name contains it, kept sorted by popularity (order lines in OrderItem), most popular first, so
+# the best matches are at the front of each list and a suggestion never scans a whole catalog.
+#
+# Built at startup (main.py lifespan). The session events below apply product creates / renames /
+# deletes and new order lines once their transaction commits. Writes made by other workers or scripts
+# are picked up by a full rebuild every SUGGEST_REFRESH_SECONDS, run in the background. Renames and
+# deletes committed while a rebuild runs are kept aside and replayed on the rebuilt index, which may
+# have read the catalog before them. Sales are not replayed: the rebuild may have counted them already,
+# and they only nudge the ranking until the next rebuild.
+
+import heapq
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+
+from sqlalchemy import event, inspect, func
+from sqlmodel import Session, select
+
+from config import SUGGEST_REFRESH_SECONDS
+from db_models import Product, OrderItem
+
+WORD = re.compile(r"\w+")
+SCAN_LIMIT = 5000       # Most candidates checked for a multi-word prefix before giving up on more matches
+
+
+# Indexed words: lower-cased, two characters or more, not plain numbers (generated names end in the id)
+def words_of(text: str) -> set:
+    return {word for word in WORD.findall(text.lower()) if len(word) > 1 and not word.isdigit()}
+
+
+# Posting keys sort ascending by (popularity descending, id ascending) as a single int, stored in array('q')
+def _key(popularity: int, product_id: int) -> int:
+    return -(popularity << 32) + product_id
+
+
+def _product_id(key: int) -> int:
+    return key & 0xFFFFFFFF
+
+
+class SuggestIndex:
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._refresh_at = 0.0
+        self._replay = None     # While a rebuild runs: [(renamed, deleted), ...] applied to the old index
+        self._set_state([], {}, {}, {}, {}, {})
+
+    def _set_state(self, words, postings, word_popularity, display, names, popularity):
+        self._words = words                       # Sorted distinct words
+        self._postings = postings                 # word -> array('q') of posting keys, ascending
+        self._word_popularity = word_popularity   # word -> summed popularity of its products
+        self._display = display                   # word -> spelling as first seen ("iPhone", not "iphone")
+        self._names = names                       # product id -> name
+        self._popularity = popularity             # product id -> order lines (only products that sold)
+
+    # -------------------------------------------------------------
+    # Building
+    # -------------------------------------------------------------
+
+    # 'session' is a sync Session (startup, or the background rebuild)
+    def load(self, session):
+        with self._lock:
+            self._replay = []
+        popularity = dict(session.exec(
+            select(OrderItem.product_id, func.count()).group_by(OrderItem.product_id)
+        ).all())
+
+        postings = {}
+        display = {}
+        names = {}
+        for product_id, name in session.exec(select(Product.id, Product.name).execution_options(yield_per=10000)):
+            names[product_id] = name
+            key = _key(popularity.get(product_id, 0), product_id)
+            for token in WORD.findall(name):
+                word = token.lower()
+                if len(word) > 1 and not word.isdigit():
+                    display.setdefault(word, token)
+            for word in words_of(name):
+                postings.setdefault(word, []).append(key)
+
+        word_popularity = {}
+        for word, keys in postings.items():
+            keys.sort()
+            postings[word] = array("q", keys)
+            word_popularity[word] = sum(popularity.get(_product_id(key), 0) for key in keys)
+        popularity = {product_id: count for product_id, count in popularity.items() if product_id in names}
+
+        with self._lock:
+            self._set_state(sorted(postings), postings, word_popularity, display, names, popularity)
+            for renamed, deleted in self._replay or ():
+                self._apply_names(renamed, deleted)
+            self._replay = None
+            self._refresh_at = time.monotonic() + self.refresh_seconds
+
+    # True for one caller once the index is older than refresh_seconds; that caller rebuilds it
+    def claim_refresh(self):
+        with self._lock:
+            if time.monotonic() < self._refresh_at:
+                return False
+            self._refresh_at = time.monotonic() + self.refresh_seconds
+            return True
+
+    # -------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------
+
+    def _words_with_prefix(self, prefix):
+        start = bisect_left(self._words, prefix)
+        end = bisect_left(self._words, prefix + "\uffff")
+        return self._words[start:end]
+
+    # Returns (words completing the last word typed, (id, name) of the best matching products).
+    # Earlier words of a multi-word prefix must appear in the product name as whole words.
+    def suggest(self, prefix: str, limit: int):
+        tokens = WORD.findall(prefix.lower())
+        if not tokens:
+            return [], []
+        last = tokens[-1]
+        required = words_of(" ".join(tokens[:-1]))
+        with self._lock:
+            matching = self._words_with_prefix(last)
+
+            terms = heapq.nlargest(
+                limit, matching, key=lambda word: (self._word_popularity[word], len(self._postings[word]))
+            )
+            terms = [self._display.get(word, word) for word in terms]
+
+            if required:
+                # Walk the rarest required word's list (already in popularity order) and check the rest
+                missing = [word for word in required if word not in self._postings]
+                driver = [] if missing else min((self._postings[word] for word in required), key=len)
+                candidates = (key for key in driver[:SCAN_LIMIT])
+            else:
+                # Every top-'limit' product is among the first 'limit' keys of one of the matching lists
+                candidates = heapq.merge(*(self._postings[word][:limit] for word in matching))
+
+            products = []
+            seen = set()
+            for key in candidates:
+                product_id = _product_id(key)
+                if product_id in seen:
+                    continue
+                seen.add(product_id)
+                name = self._names[product_id]
+                if required:
+                    name_words = words_of(name)
+                    if not required <= name_words or not any(word.startswith(last) for word in name_words):
+                        continue
+                products.append((product_id, name))
+                if len(products) == limit:
+                    break
+            return terms, products
+
+    # -------------------------------------------------------------
+    # Incremental updates (called after a commit)
+    # -------------------------------------------------------------
+
+    def _add(self, product_id, name):
+        self._names[product_id] = name
+        popularity = self._popularity.get(product_id, 0)
+        key = _key(popularity, product_id)
+        for token in WORD.findall(name):
+            word = token.lower()
+            if len(word) > 1 and not word.isdigit():
+                self._display.setdefault(word, token)
+        for word in words_of(name):
+            keys = self._postings.get(word)
+            if keys is None:
+                keys = self._postings[word] = array("q")
+                self._word_popularity[word] = 0
+                insort(self._words, word)
+            insort(keys, key)
+            self._word_popularity[word] += popularity
+
+    # Finds the product's key in a posting list. Normally it is the key its current popularity gives;
+    # if the two ever disagree, the list is searched for the product id instead of deleting whatever
+    # key sorts there (another product's posting).
+    def _position(self, keys, key, product_id):
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return i
+        for i, other in enumerate(keys):
+            if _product_id(other) == product_id:
+                return i
+        return None
+
+    def _remove(self, product_id):
+        name = self._names.pop(product_id, None)
+        if name is None:
+            return
+        popularity = self._popularity.get(product_id, 0)
+        key = _key(popularity, product_id)
+        for word in words_of(name):
+            keys = self._postings.get(word)
+            i = self._position(keys, key, product_id) if keys is not None else None
+            if i is None:
+                continue
+            del keys[i]
+            self._word_popularity[word] -= popularity
+            if not keys:
+                del self._postings[word], self._word_popularity[word], self._display[word]
+                del self._words[bisect_left(self._words, word)]
+
+    def _apply_names(self, renamed, deleted):
+        for product_id in deleted:
+            self._remove(product_id)
+            self._popularity.pop(product_id, None)
+        for product_id, name in renamed.items():
+            self._remove(product_id)
+            self._add(product_id, name)
+
+    def apply(self, renamed, deleted, sold):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((renamed, deleted))
+            self._apply_names(renamed, deleted)
+            for product_id, count in sold.items():
+                name = self._names.get(product_id)
+                if name is None:
+                    continue
+                popularity = self._popularity.get(product_id, 0) + count
+                self._remove(product_id)
+                self._popularity[product_id] = popularity
+                self._add(product_id, name)
+
+
+product_suggest_index = SuggestIndex(SUGGEST_REFRESH_SECONDS)
+
+
+# -----------------------------------------------------------------
+# Write-Driven Updates
+# -----------------------------------------------------------------
+# after_flush sees the pre-flush new / dirty / deleted sets with ids already assigned. Changes are
+# collected per transaction and applied once it commits.
+
+@event.listens_for(Session, "after_flush")
+def collect_suggest_changes(session, flush_context):
+    renamed = {}
+    deleted = set()
+    sold = {}
+    for obj in session.new:
+        if isinstance(obj, Product):
+            renamed[obj.id] = obj.name
+        elif isinstance(obj, OrderItem):
+            sold[obj.product_id] = sold.get(obj.product_id, 0) + 1
+    for obj in session.dirty:
+        if isinstance(obj, Product) and inspect(obj).attrs.name.history.has_changes():
+            renamed[obj.id] = obj.name
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            deleted.add(obj.id)
+
+    if renamed or deleted or sold:
+        pending = session.info.setdefault("suggest_changes", ({}, set(), {}))
+        pending[0].update(renamed)
+        pending[1].update(deleted)
+        for product_id, count in sold.items():
+            pending[2][product_id] = pending[2].get(product_id, 0) + count
+
+
+@event.listens_for(Session, "after_commit")
+def apply_suggest_changes(session):
+    changes = session.info.pop("suggest_changes", None)
+    if changes:
+        renamed, deleted, sold = changes
+        product_suggest_index.apply({k: v for k, v in renamed.items() if k not in deleted}, deleted, sold)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_suggest_changes(session):
+    session.info.pop("suggest_changes", None)
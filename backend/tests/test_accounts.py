@@ -0,0 +1,55 @@
+import hashlib
+import time
+from datetime import datetime, timedelta
+
+
+def test_expired_reset_code_is_refused_and_swept(api):
+    api.signup("customer", "expiry@example.com")
+    assert api.client.post("/auth/forgot-password", json={"email": "expiry@example.com"}).status_code == 200
+    otp = api.query("SELECT otp FROM passwordreset WHERE email = 'expiry@example.com'")[0][0]
+
+    response = api.client.post("/auth/verify-otp-only", json={"email": "expiry@example.com", "otp": otp})
+    assert response.status_code == 200, response.text
+
+    api.query(
+        "UPDATE passwordreset SET expires_at = :past WHERE email = 'expiry@example.com'",
+        past=datetime.utcnow() - timedelta(minutes=1),
+    )
+    response = api.client.post("/auth/verify-otp-only", json={"email": "expiry@example.com", "otp": otp})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "OTP has expired."
+
+    # The sweeper runs every OTP_SWEEP_SECONDS (1 s for the tests)
+    deadline = time.monotonic() + 10
+    while api.query("SELECT count(*) FROM passwordreset WHERE email = 'expiry@example.com'")[0][0]:
+        assert time.monotonic() < deadline, "expired code was not swept"
+        time.sleep(0.2)
+
+
+def test_legacy_sha256_hash_is_upgraded_at_login(api):
+    api.signup("customer", "legacy@example.com")
+    legacy = hashlib.sha256(b"old-password").hexdigest()
+    api.query("UPDATE customer SET hashed_password = :hash WHERE mail = 'legacy@example.com'", hash=legacy)
+
+    wrong = api.client.post("/login/customer", json={"mail": "legacy@example.com", "password": "nope"})
+    assert wrong.status_code == 401
+    assert api.query("SELECT hashed_password FROM customer WHERE mail = 'legacy@example.com'")[0][0] == legacy
+
+    api.login("customer", "legacy@example.com", "old-password")
+    upgraded = api.query("SELECT hashed_password FROM customer WHERE mail = 'legacy@example.com'")[0][0]
+    assert upgraded.startswith("scrypt$")
+    api.login("customer", "legacy@example.com", "old-password")
+
+
+def test_password_reset_reaches_every_account_of_the_email(api):
+    api.signup("customer", "both@example.com")
+    api.signup("wholesaler", "both@example.com")
+    assert api.client.post("/auth/forgot-password", json={"email": "both@example.com"}).status_code == 200
+    otp = api.query("SELECT otp FROM passwordreset WHERE email = 'both@example.com'")[0][0]
+
+    response = api.client.post(
+        "/auth/reset-password", json={"email": "both@example.com", "otp": otp, "new_password": "new-pw"}
+    )
+    assert response.status_code == 200, response.text
+    api.login("customer", "both@example.com", "new-pw")
+    api.login("wholesaler", "both@example.com", "new-pw")
@@ -0,0 +1,64 @@
+def cache_stats(api):
+    return api.client.get("/health/cache").json()
+
+
+def test_listing_cache_is_dropped_when_a_product_commits(api, add_product):
+    url = "/products?category=groceries&limit=50"
+    before = [product["id"] for product in api.client.get(url).json()]
+    hits = cache_stats(api)["hits"]
+    assert [product["id"] for product in api.client.get(url).json()] == before
+    assert cache_stats(api)["hits"] == hits + 1
+
+    product = add_product("Cached Rice", 12, category_id=2)
+    assert product["id"] in [listed["id"] for listed in api.client.get(url).json()]
+
+
+def test_principal_cache_is_dropped_when_the_account_changes(api):
+    headers = api.signup("customer", "rename@example.com")
+    assert api.client.get("/customer/me", headers=headers).json()["name"] == "rename"
+    hits = cache_stats(api)["principals"]["hits"]
+    api.client.get("/customer/me", headers=headers)
+    assert cache_stats(api)["principals"]["hits"] == hits + 1
+
+    response = api.client.patch("/customer/me/update", headers=headers, json={"name": "Renamed"})
+    assert response.status_code == 200, response.text
+    assert api.client.get("/customer/me", headers=headers).json()["name"] == "Renamed"
+
+
+def test_writes_through_a_stale_cached_principal_keep_other_changes(api, add_product):
+    headers = api.signup("customer", "stale@example.com")
+    assert api.client.get("/customer/me", headers=headers).json()["no_of_purchases"] == 0
+
+    # Another worker's checkouts: the database moves on, this worker's cached account does not
+    api.query("UPDATE customer SET no_of_purchases = no_of_purchases + 5 WHERE mail = 'stale@example.com'")
+
+    product = add_product("Stale Kettle", 20)
+    api.client.get("/cart", headers=headers)
+    response = api.client.post("/cart/add", headers=headers, json={"product_id": product["id"], "quantity": 1})
+    assert response.status_code == 200, response.text
+    response = api.client.post(
+        "/order/checkout", headers=headers,
+        json={"shipping_address": "a", "shipping_city": "c", "shipping_pincode": "1", "payment_mode": "Offline"},
+    )
+    assert response.status_code == 200, response.text
+    assert api.query("SELECT no_of_purchases FROM customer WHERE mail = 'stale@example.com'")[0][0] == 6
+
+    api.query("UPDATE customer SET no_of_purchases = no_of_purchases + 1 WHERE mail = 'stale@example.com'")
+    api.client.get("/customer/me", headers=headers)
+    response = api.client.patch("/customer/me/update", headers=headers, json={"name": "Fresh"})
+    assert response.json()["no_of_purchases"] == 7
+
+
+def test_listing_cache_misses_after_another_workers_write(api, add_product):
+    product = add_product("Other Worker Lamp", 4321)
+    url = "/products?min_price=4300&max_price=4400"
+    first = api.client.get(url)
+    assert [listed["price"] for listed in first.json()] == [4321]
+    assert api.client.get(url).headers["etag"] == first.headers["etag"]
+
+    # A write committed through another worker: this worker's cache entry is not dropped, the version moves on
+    api.query("UPDATE product SET price = 4322 WHERE id = :id", id=product["id"])
+    api.query("UPDATE dataversion SET version = version + 1 WHERE name = 'product'")
+    response = api.client.get(url)
+    assert response.headers["etag"] != first.headers["etag"]
+    assert [listed["price"] for listed in response.json()] == [4322]
@@ -0,0 +1,29 @@
+def test_matching_etag_gets_304_until_the_catalog_changes(api, add_product):
+    product = add_product("Etag Lamp", 30)
+    for url in ("/products?limit=5", f"/products/{product['id']}", f"/products/{product['id']}/feedback"):
+        response = api.client.get(url)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+
+        not_modified = api.client.get(url, headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert not_modified.headers["etag"] == etag
+
+        stale = api.client.get(url, headers={"If-None-Match": 'W/"0-0"'})
+        assert stale.status_code == 200
+
+    etag = api.client.get(f"/products/{product['id']}").headers["etag"]
+    add_product("Etag Lamp 2", 31)
+    changed = api.client.get(f"/products/{product['id']}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_if_modified_since_alone_does_not_give_304(api, add_product):
+    add_product("Dated Lamp", 32)
+    response = api.client.get("/products?limit=5")
+    last_modified = response.headers["last-modified"]
+
+    # A write in the same second would not move Last-Modified, so only the ETag can say "unchanged"
+    assert api.client.get("/products?limit=5", headers={"If-Modified-Since": last_modified}).status_code == 200
@@ -0,0 +1,76 @@
+import pytest
+
+# Expected order of each sort, as a Python sort key over the listed products
+SORT_KEYS = {
+    "newest": lambda product: -product["id"],
+    "price_low": lambda product: (product["price"], product["id"]),
+    "price_high": lambda product: (-product["price"], -product["id"]),
+    "rating": lambda product: (-product["rating_avg"], -product["id"]),
+}
+MIN_PRICE = 5000      # Only this module's products are priced this high
+
+
+@pytest.fixture(scope="module")
+def catalog(api, retailer):
+    customer = api.signup("customer", "pages@example.com")
+    products = []
+    for i in range(13):
+        response = api.client.post(
+            "/products/add/", headers=retailer,
+            data={"name": f"Page Item {i}", "price": str(MIN_PRICE + i % 4), "stock": "5", "category_id": "1"},
+        )
+        assert response.status_code == 201, response.text
+        products.append(response.json())
+    for product, rating in zip(products, (5, 3, 3, 1, 4)):
+        response = api.client.post("/feedback/add", headers=customer, json={"product_id": product["id"], "rating": rating})
+        assert response.status_code == 200, response.text
+    return products
+
+
+def walk(api, sort_by, limit):
+    ids, cursor = [], None
+    while True:
+        params = {"min_price": MIN_PRICE, "sort_by": sort_by, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = api.client.get("/products", params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page) <= limit
+        ids += [product["id"] for product in page]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("sort_by", list(SORT_KEYS))
+@pytest.mark.parametrize("limit", [1, 4, 13, 50])
+def test_cursor_pages_cover_the_listing_once_in_order(api, catalog, sort_by, limit):
+    listed = api.client.get("/products", params={"min_price": MIN_PRICE, "limit": 100}).json()
+    assert len(listed) == len(catalog)
+    expected = [product["id"] for product in sorted(listed, key=SORT_KEYS[sort_by])]
+
+    assert walk(api, sort_by, limit) == expected
+
+
+def test_newest_cursor_survives_a_price_change(api, retailer, catalog):
+    first = api.client.get("/products", params={"min_price": MIN_PRICE, "sort_by": "newest", "limit": 3})
+    last_id = first.json()[-1]["id"]
+    response = api.client.put(f"/retailer/products/{last_id}", headers=retailer, json={"price": MIN_PRICE + 3.5})
+    assert response.status_code == 200, response.text
+
+    second = api.client.get(
+        "/products",
+        params={"min_price": MIN_PRICE, "sort_by": "newest", "limit": 3, "cursor": first.headers["x-next-cursor"]},
+    )
+    assert second.status_code == 200, second.text
+    assert all(product["id"] < last_id for product in second.json())
+
+
+def test_cursor_of_another_sort_is_rejected(api, catalog):
+    first = api.client.get("/products", params={"min_price": MIN_PRICE, "sort_by": "price_low", "limit": 2})
+    cursor = first.headers["x-next-cursor"]
+
+    for sort_by, bad_cursor in (("rating", cursor), ("price_low", "not-a-cursor")):
+        response = api.client.get("/products", params={"sort_by": sort_by, "cursor": bad_cursor})
+        assert response.status_code == 400
@@ -0,0 +1,21 @@
+import httpx
+
+
+# Without the recent-write cookie, catalog reads go through the read-only pool. It must open the
+# database DATABASE_URL names (the test's own file), not the repository's livemart.db.
+def test_reads_without_a_recent_write_use_the_configured_database(api, add_product):
+    product = add_product("Read Pool Radio", 77.5)
+
+    with httpx.Client(base_url=api.client.base_url, timeout=30) as reader:
+        for url in (
+            "/products?min_price=77&max_price=78",
+            "/products?category=electronics&sort_by=price_high&min_price=77&max_price=78",
+            f"/products/batch?ids={product['id']}",
+        ):
+            response = reader.get(url)
+            assert response.status_code == 200, (url, response.text)
+            assert product["id"] in [listed["id"] for listed in response.json()], url
+
+        facets = reader.get("/products/facets?min_price=77&max_price=78")
+        assert facets.status_code == 200, facets.text
+        assert reader.get(f"/products/{product['id']}/related").status_code == 200
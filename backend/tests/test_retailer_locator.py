@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from retailer_locator import RetailerLocator, haversine_km
+
+
+def brute_force(locations, lat, lon, k, radius_km):
+    distances = sorted(
+        (haversine_km(lat, lon, location["lat"], location["lon"]), retailer_id)
+        for retailer_id, location in locations.items()
+    )
+    if radius_km is not None:
+        distances = [(distance, retailer_id) for distance, retailer_id in distances if distance <= radius_km]
+    return distances[:k]
+
+
+def random_point(rng):
+    kind = rng.random()
+    if kind < 0.3:      # next to the antimeridian
+        return rng.uniform(-85, 85), rng.choice((-1, 1)) * rng.uniform(175, 180)
+    if kind < 0.6:      # next to a pole
+        return rng.choice((-1, 1)) * rng.uniform(80, 90), rng.uniform(-180, 180)
+    return rng.uniform(-90, 90), rng.uniform(-180, 180)
+
+
+@pytest.mark.parametrize("cell_degrees", [0.05, 0.7, 5.0, 30.0])
+@pytest.mark.parametrize("seed", range(5))
+def test_nearby_matches_brute_force(cell_degrees, seed):
+    rng = random.Random(seed)
+    locator = RetailerLocator(cell_degrees, refresh_seconds=300)
+    locations = {}
+    for retailer_id in range(1, rng.choice((5, 60, 400)) + 1):
+        lat, lon = random_point(rng)
+        locations[retailer_id] = {"id": retailer_id, "name": "", "lat": lat, "lon": lon, "address": ""}
+    locator.apply(locations)
+
+    for _ in range(300):
+        lat, lon = random_point(rng)
+        k = rng.choice((1, 3, 10))
+        radius_km = rng.choice((None, 50.0, 1500.0))
+        expected = brute_force(locations, lat, lon, k, radius_km)
+        found = locator.nearby(lat, lon, k, radius_km)
+
+        assert len(found) == len(expected)
+        for result, (distance, _) in zip(found, expected):
+            # Ties may come back in either order; the distances must match
+            assert result["distance_km"] == pytest.approx(distance, abs=1e-3)
+
+
+def test_nearby_across_the_antimeridian():
+    locator = RetailerLocator(0.05, refresh_seconds=300)
+    locator.apply({
+        1: {"id": 1, "name": "east", "lat": 10.0, "lon": 179.99, "address": ""},
+        2: {"id": 2, "name": "far", "lat": 10.0, "lon": 178.0, "address": ""},
+    })
+    found = locator.nearby(10.0, -179.99, k=1)
+    assert [result["id"] for result in found] == [1]
+    assert found[0]["distance_km"] < 3
@@ -0,0 +1,51 @@
+from sqlmodel import Session, SQLModel, create_engine
+
+from db_models import Product
+from suggest_index import SuggestIndex
+
+
+def product_ids(index, prefix):
+    return [product_id for product_id, _ in index.suggest(prefix, 10)[1]]
+
+
+def test_sales_reorder_suggestions_and_renames_keep_other_postings():
+    index = SuggestIndex(refresh_seconds=600)
+    index.apply({1: "Red Apple", 2: "Green Apple", 3: "Apple Juice"}, set(), {})
+    index.apply({}, set(), {2: 3, 3: 1})
+    assert product_ids(index, "apple") == [2, 3, 1]
+
+    index.apply({}, set(), {1: 5})
+    assert product_ids(index, "apple") == [1, 2, 3]
+
+    # Renamed and sold in one commit: its old postings go, the other products' stay in order
+    index.apply({1: "Blue Pear"}, set(), {1: 1})
+    assert product_ids(index, "apple") == [2, 3]
+    assert product_ids(index, "pear") == [1]
+
+    index.apply({}, {2}, {3: 1})
+    assert product_ids(index, "apple") == [3]
+    assert index.suggest("gr", 10) == ([], [])
+
+
+def test_changes_committed_during_a_rebuild_are_replayed():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Product(id=1, name="Red Apple", price=1, stock=1, retailer_id=1))
+        session.add(Product(id=2, name="Green Apple", price=1, stock=1, retailer_id=1))
+        session.commit()
+
+    index = SuggestIndex(refresh_seconds=600)
+
+    class RebuildSession(Session):
+        # A rename and a delete commit elsewhere while the rebuild reads the catalog
+        def exec(self, statement, **kwargs):
+            result = super().exec(statement, **kwargs)
+            index.apply({1: "Blue Pear"}, {2}, {})
+            return result
+
+    with RebuildSession(engine) as session:
+        index.load(session)
+
+    assert product_ids(index, "apple") == []
+    assert product_ids(index, "pear") == [1]
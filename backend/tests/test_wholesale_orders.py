@@ -0,0 +1,34 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def wholesaler(api):
+    return api.signup("wholesaler", "supplier@example.com")
+
+
+def ship(api, retailer, wholesaler, name):
+    response = api.client.post(
+        "/wholesaler/products/add", headers=wholesaler, data={"name": name, "price": "10", "stock": "100"},
+    )
+    assert response.status_code == 200, response.text
+    response = api.client.post(
+        "/retailer/wholesale-order", headers=retailer, params={"item_id": response.json()["id"], "quantity": 20},
+    )
+    assert response.status_code == 200, response.text
+    order_id = api.query("SELECT max(id) FROM wholesaleorder")[0][0]
+    return order_id, api.client.put(f"/wholesaler/orders/{order_id}/status", headers=wholesaler, json={"status": "Shipped"})
+
+
+def test_shipping_a_new_product_without_the_wholesale_category_is_refused(api, retailer, wholesaler):
+    order_id, response = ship(api, retailer, wholesaler, "Bulk Cable")
+    assert response.status_code == 409, response.text
+    assert "Wholesale" in response.json()["detail"]
+    assert api.query("SELECT status FROM wholesaleorder WHERE id = :id", id=order_id)[0][0] == "Pending"
+    assert api.query("SELECT count(*) FROM product WHERE name = 'Bulk Cable'")[0][0] == 0
+
+
+def test_shipping_restocks_an_existing_product_without_the_category(api, retailer, wholesaler, add_product):
+    product = add_product("Bulk Charger", 15, stock=3)
+    order_id, response = ship(api, retailer, wholesaler, "Bulk Charger")
+    assert response.status_code == 200, response.text
+    assert api.query("SELECT stock FROM product WHERE id = :id", id=product["id"])[0][0] == 23